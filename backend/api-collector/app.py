@@ -1,39 +1,120 @@
+# gevent必须在其他模块导入前打补丁, 使requests等阻塞IO变为协程调度
+from gevent import monkey
+monkey.patch_all()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from flask_compress import Compress
+from gevent.pywsgi import WSGIServer
 import requests
+import orjson
 import logging
-from datetime import datetime
 import os
-import json
+import sys
+import hashlib
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
+from cachetools import LRUCache
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.redis_client import RedisClient
+from common.clock import iso_now
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/api_collector.log'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志: 请求线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/api_collector.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-# 线程池
-executor = ThreadPoolExecutor(max_workers=10)
+# 响应压缩
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
+
+# 线程池 (批量采集为IO密集型, 可通过COLLECTOR_WORKERS调整并发度)
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('COLLECTOR_WORKERS', 10)))
+
+# 单个响应体的最大读取字节数, 超出部分截断
+MAX_RESPONSE_BYTES = int(os.getenv('COLLECTOR_MAX_RESPONSE_BYTES', 10 * 1024 * 1024))
+
+# GET请求结果的默认缓存时间(秒), 0表示不缓存
+DEFAULT_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 10))
+
+redis_client = RedisClient(os.getenv('REDIS_URL'))
+
+# 进程内一级缓存, 保存(过期时间, 已解析结果), 命中时跳过Redis往返和JSON解析
+_parsed_cache = LRUCache(maxsize=1024)
+_parsed_cache_lock = threading.Lock()
 
 class APICollector:
     def __init__(self):
+        # requests.Session 的 GET/POST 调用可在线程池中共享, 无需额外加锁
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'MultiProtocol-DataCollector/1.0'
         })
+        self._dispatch = {
+            'GET': self.session.get,
+            'POST': self.session.post,
+            'PUT': self.session.put,
+            'DELETE': self.session.delete
+        }
+    
+    def _cache_key(self, config):
+        """根据规范化的请求配置生成缓存键"""
+        canonical = orjson.dumps(
+            {field: config.get(field) for field in ('url', 'method', 'headers', 'params', 'data')},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return 'apicache:' + hashlib.blake2b(canonical, digest_size=16).hexdigest()
+    
+    def _cache_ttl(self, config):
+        """解析配置中的缓存时间(秒); 无法转换为整数或不大于0时不缓存"""
+        try:
+            return max(int(config.get('cache_ttl', DEFAULT_CACHE_TTL)), 0)
+        except (TypeError, ValueError):
+            return 0
     
     def collect_data(self, config):
-        """收集API数据"""
+        """收集API数据, 成功的GET结果依次缓存在进程内存和Redis中; 任何配置错误都以(None, 错误信息)返回"""
+        try:
+            cache_ttl = self._cache_ttl(config)
+            cacheable = cache_ttl > 0 and config.get('method', 'GET').upper() == 'GET'
+            
+            if cacheable:
+                cache_key = self._cache_key(config)
+                with _parsed_cache_lock:
+                    entry = _parsed_cache.get(cache_key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1], None
+                
+                # 一级缓存只保留Redis中剩余的有效期, 结果的总缓存时间不超过cache_ttl
+                cached, remaining = redis_client.get_with_ttl(cache_key)
+                if cached is not None:
+                    if remaining is not None:
+                        with _parsed_cache_lock:
+                            _parsed_cache[cache_key] = (time.monotonic() + min(remaining, cache_ttl), cached)
+                    return cached, None
+        except Exception as e:
+            logger.error(f"API collection failed: {str(e)}")
+            return None, str(e)
+        
+        result, error = self._fetch(config)
+        
+        if cacheable and not error and result['success']:
+            redis_client.set(cache_key, result, ex=cache_ttl)
+            with _parsed_cache_lock:
+                _parsed_cache[cache_key] = (time.monotonic() + cache_ttl, result)
+        
+        return result, error
+    
+    def _fetch(self, config):
+        """发送API请求"""
         try:
             url = config.get('url')
             method = config.get('method', 'GET').upper()
@@ -42,56 +123,34 @@ class APICollector:
             data = config.get('data', {})
             timeout = config.get('timeout', 30)
             
-            # 更新请求头
-            request_headers = self.session.headers.copy()
-            request_headers.update(headers)
-            
-            # 发送请求
-            if method == 'GET':
-                response = self.session.get(
-                    url, 
-                    headers=request_headers,
-                    params=params,
-                    timeout=timeout
-                )
-            elif method == 'POST':
-                response = self.session.post(
-                    url,
-                    headers=request_headers,
-                    params=params,
-                    json=data,
-                    timeout=timeout
-                )
-            elif method == 'PUT':
-                response = self.session.put(
-                    url,
-                    headers=request_headers,
-                    params=params,
-                    json=data,
-                    timeout=timeout
-                )
-            elif method == 'DELETE':
-                response = self.session.delete(
-                    url,
-                    headers=request_headers,
-                    params=params,
-                    timeout=timeout
-                )
-            else:
+            # 发送请求, 请求头由requests自动与会话头合并
+            send = self._dispatch.get(method)
+            if send is None:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
+            kwargs = {
+                'headers': headers,
+                'params': params,
+                'timeout': timeout,
+                'stream': True
+            }
+            if method in ('POST', 'PUT'):
+                kwargs['json'] = data
+            response = send(url, **kwargs)
+            
             # 解析响应
             try:
-                response_data = response.json()
-            except json.JSONDecodeError:
-                response_data = response.text
+                response_data, truncated = self._read_body(response)
+            finally:
+                response.close()
             
             return {
                 'status_code': response.status_code,
                 'headers': dict(response.headers),
                 'data': response_data,
+                'truncated': truncated,
                 'response_time': response.elapsed.total_seconds(),
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': iso_now(),
                 'success': response.status_code < 400
             }, None
             
@@ -102,23 +161,41 @@ class APICollector:
             logger.error(f"API collection failed: {str(e)}")
             return None, str(e)
     
+    def _read_body(self, response):
+        """分块读取响应体, 最多读取MAX_RESPONSE_BYTES字节"""
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=65536):
+            body += chunk
+            if len(body) > MAX_RESPONSE_BYTES:
+                break
+        
+        if len(body) > MAX_RESPONSE_BYTES:
+            # 超出上限时只返回头部文本
+            head = bytes(body[:MAX_RESPONSE_BYTES])
+            return head.decode(response.encoding or 'utf-8', errors='replace'), True
+        
+        try:
+            return orjson.loads(body), False
+        except ValueError:
+            return body.decode(response.encoding or 'utf-8', errors='replace'), False
+    
     def batch_collect(self, configs):
         """批量收集API数据"""
         results = []
         
-        for config in configs:
-            result, error = self.collect_data(config)
+        # 并发发送请求, executor.map 保持结果顺序与configs一致
+        for config, (result, error) in zip(configs, executor.map(self.collect_data, configs)):
             if error:
                 results.append({
                     'config': config,
                     'error': error,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': iso_now()
                 })
             else:
                 results.append({
                     'config': config,
                     'result': result,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': iso_now()
                 })
         
         return results
@@ -129,7 +206,7 @@ api_collector = APICollector()
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': iso_now(),
         'service': 'api-collector'
     })
 
@@ -161,7 +238,7 @@ def batch_collect():
     return jsonify({
         'results': results,
         'count': len(results),
-        'timestamp': datetime.now().isoformat()
+        'timestamp': iso_now()
     })
 
 @app.route('/test-connection', methods=['POST'])
@@ -177,7 +254,8 @@ def test_connection():
         test_config = {
             'url': data['url'],
             'method': 'GET',
-            'timeout': 10
+            'timeout': 10,
+            'cache_ttl': 0
         }
         
         result, error = api_collector.collect_data(test_config)
@@ -186,21 +264,21 @@ def test_connection():
             return jsonify({
                 'connected': False,
                 'error': error,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_now()
             })
         
         return jsonify({
             'connected': True,
             'status_code': result['status_code'],
             'response_time': result['response_time'],
-            'timestamp': datetime.now().isoformat()
+            'timestamp': iso_now()
         })
         
     except Exception as e:
         return jsonify({
             'connected': False,
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': iso_now()
         })
 
 if __name__ == '__main__':
@@ -208,4 +286,4 @@ if __name__ == '__main__':
     os.makedirs('logs', exist_ok=True)
     
     logger.info("Starting API Collector...")
-    app.run(host='0.0.0.0', port=8020, debug=False)
\ No newline at end of file
+    WSGIServer(('0.0.0.0', 8020), app).serve_forever()
\ No newline at end of file
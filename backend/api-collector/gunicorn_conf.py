@@ -0,0 +1,8 @@
+# Gunicorn配置: gevent协程worker, 单个worker即可处理大量并发IO请求
+import os
+
+bind = '0.0.0.0:8020'
+worker_class = 'gevent'
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+worker_connections = 1000
+keepalive = 75
@@ -1,25 +1,41 @@
-from flask import Flask, request, jsonify
+# gevent必须在其他模块导入前打补丁, 使requests等阻塞IO变为协程调度
+from gevent import monkey
+monkey.patch_all()
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from flask_compress import Compress
+from gevent.pywsgi import WSGIServer
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-from datetime import datetime
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from werkzeug.exceptions import RequestEntityTooLarge
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/api_gateway.log'),
-        logging.StreamHandler()
-    ]
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.redis_client import RedisClient
+from common.clock import iso_now
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
+
+# 配置日志: 请求线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/api_gateway.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
+# 响应压缩
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+# 不压缩流式响应: 否则未压缩的上游响应会被整体读入内存再压缩, 失去代理边读边转发的效果
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+
 # 配置
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
@@ -33,6 +49,35 @@ SERVICES = {
     'task-scheduler': 'http://localhost:8040'
 }
 
+# 复用连接的HTTP会话, 避免每次转发都重新握手
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.1)
+)
+session.mount('http://', adapter)
+session.mount('https://', adapter)
+
+# 健康检查线程池
+health_executor = ThreadPoolExecutor(max_workers=16)
+
+# 批量请求线程池, 同一批内的操作并发执行
+batch_executor = ThreadPoolExecutor(max_workers=32)
+MAX_BATCH_OPS = 256
+
+# 健康检查专用会话, 与各服务保持长连接
+hc_session = requests.Session()
+hc_adapter = HTTPAdapter(pool_connections=len(SERVICES), pool_maxsize=len(SERVICES))
+hc_session.mount('http://', hc_adapter)
+hc_session.mount('https://', hc_adapter)
+
+# 服务状态缓存, 合并短时间内的突发请求
+SERVICES_CACHE_KEY = 'gateway:services'
+SERVICES_CACHE_TTL = 2
+
+redis_client = RedisClient(os.getenv('REDIS_URL'))
+
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
     return jsonify({'error': 'File too large'}), 413
@@ -41,7 +86,7 @@ def handle_file_too_large(e):
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': iso_now(),
         'service': 'api-gateway'
     })
 
@@ -55,41 +100,132 @@ def proxy_request(service_name, path):
     
     try:
         # 转发请求
-        if request.method == 'GET':
-            response = requests.get(target_url, params=request.args, timeout=30)
-        elif request.method == 'POST':
-            response = requests.post(target_url, json=request.get_json(), timeout=30)
-        elif request.method == 'PUT':
-            response = requests.put(target_url, json=request.get_json(), timeout=30)
-        elif request.method == 'DELETE':
-            response = requests.delete(target_url, timeout=30)
+        response = session.request(
+            request.method,
+            target_url,
+            params=request.args if request.method == 'GET' else None,
+            json=request.get_json() if request.method in ('POST', 'PUT') else None,
+            headers={'Accept-Encoding': request.headers.get('Accept-Encoding', 'identity')},
+            timeout=30,
+            stream=True
+        )
         
-        return jsonify(response.json()), response.status_code
+        def generate():
+            # 边下载边转发原始字节, 上游已压缩的内容不解压再压缩
+            try:
+                for chunk in response.raw.stream(65536, decode_content=False):
+                    yield chunk
+            finally:
+                response.close()
+        
+        proxied = Response(
+            stream_with_context(generate()),
+            status=response.status_code,
+            content_type=response.headers.get('Content-Type')
+        )
+        content_encoding = response.headers.get('Content-Encoding')
+        if content_encoding:
+            proxied.headers['Content-Encoding'] = content_encoding
+            proxied.headers['Vary'] = 'Accept-Encoding'
+        return proxied
     
     except requests.exceptions.RequestException as e:
         logger.error(f"Error proxying request to {service_name}: {str(e)}")
         return jsonify({'error': f'Service {service_name} unavailable'}), 503
 
+def _ssh_session(op):
+    """在网关内完成一次SSH会话: 建立连接 -> 执行命令 -> 断开连接"""
+    service_url = SERVICES['ssh']
+    connect_response = session.post(f"{service_url}/connect", json=op.get('connection', {}), timeout=30)
+    if connect_response.status_code != 200:
+        return {'status': connect_response.status_code, 'error': f"SSH connection failed: {connect_response.text}"}
+    
+    connection_id = connect_response.json()['connection_id']
+    try:
+        execute_response = session.post(
+            f"{service_url}/execute",
+            json={'connection_id': connection_id, 'command': op.get('command', 'echo "Hello World"')},
+            timeout=30
+        )
+        return {'status': execute_response.status_code, 'body': execute_response.json()}
+    finally:
+        session.post(f"{service_url}/disconnect", json={'connection_id': connection_id}, timeout=30)
+
+# 批量接口支持的操作
+BATCH_OPS = {
+    'ssh.session': _ssh_session
+}
+
+def run_batch_op(op):
+    """执行批量请求中的单个操作, 失败只影响该操作自身的结果"""
+    name = op.get('op') if isinstance(op, dict) else None
+    handler = BATCH_OPS.get(name) if isinstance(name, str) else None
+    if handler is None:
+        return {'status': 400, 'error': 'Unsupported op'}
+    try:
+        return handler(op)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Batch op {name} failed: {str(e)}")
+        return {'status': 503, 'error': str(e)}
+    except Exception as e:
+        # 参数格式错误等异常同样只记入该操作的结果, 不能让整个批量请求返回500
+        logger.error(f"Batch op {name} failed: {str(e)}")
+        return {'status': 500, 'error': str(e)}
+
+@app.route('/api/batch', methods=['POST'])
+def batch_request():
+    """批量执行操作, 结果按ops顺序返回"""
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    
+    if not isinstance(ops, list):
+        return jsonify({'error': 'Missing ops'}), 400
+    if len(ops) > MAX_BATCH_OPS:
+        return jsonify({'error': f'Too many ops, max {MAX_BATCH_OPS}'}), 400
+    
+    results = list(batch_executor.map(run_batch_op, ops))
+    return jsonify({
+        'results': results,
+        'timestamp': iso_now()
+    })
+
+def check_service_health(service_url):
+    """探测单个服务的健康状态"""
+    try:
+        # 使用HEAD请求避免传输响应体, 不支持HEAD的服务回退为GET
+        response = hc_session.head(f"{service_url}/health", timeout=2, allow_redirects=False)
+        if response.status_code in (404, 405, 501):
+            response = hc_session.get(f"{service_url}/health", timeout=2)
+        return {
+            'url': service_url,
+            'status': 'healthy' if response.status_code == 200 else 'unhealthy',
+            'response_time': response.elapsed.total_seconds()
+        }
+    except requests.exceptions.RequestException:
+        return {
+            'url': service_url,
+            'status': 'unavailable',
+            'response_time': None
+        }
+
 @app.route('/services', methods=['GET'])
 def list_services():
     """列出所有可用服务"""
+    cached = redis_client.get(SERVICES_CACHE_KEY)
+    if cached is not None:
+        return jsonify(cached)
+    
     service_status = {}
     
-    for service_name, service_url in SERVICES.items():
-        try:
-            response = requests.get(f"{service_url}/health", timeout=5)
-            service_status[service_name] = {
-                'url': service_url,
-                'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                'response_time': response.elapsed.total_seconds()
-            }
-        except requests.exceptions.RequestException:
-            service_status[service_name] = {
-                'url': service_url,
-                'status': 'unavailable',
-                'response_time': None
-            }
+    # 并发探测所有服务, 总耗时取决于最慢的服务
+    futures = {
+        health_executor.submit(check_service_health, service_url): service_name
+        for service_name, service_url in SERVICES.items()
+    }
+    for future in as_completed(futures):
+        service_status[futures[future]] = future.result()
     
+    redis_client.set(SERVICES_CACHE_KEY, service_status, ex=SERVICES_CACHE_TTL)
     return jsonify(service_status)
 
 if __name__ == '__main__':
@@ -97,4 +233,4 @@ if __name__ == '__main__':
     os.makedirs('logs', exist_ok=True)
     
     logger.info("Starting API Gateway...")
-    app.run(host='0.0.0.0', port=8000, debug=False)
\ No newline at end of file
+    WSGIServer(('0.0.0.0', 8000), app).serve_forever()
\ No newline at end of file
@@ -0,0 +1,17 @@
+from datetime import datetime
+import time
+
+# 缓存的(时间片, ISO时间字符串), 元组整体替换保证线程安全
+_RESOLUTION = 10  # 每秒时间片数, 即100ms精度
+_cached = (0, '')
+
+def iso_now() -> str:
+    """返回当前时间的ISO格式字符串, 同一100ms时间片内复用已格式化的结果"""
+    global _cached
+    now = time.time()
+    tick = int(now * _RESOLUTION)
+    cached_tick, cached_iso = _cached
+    if tick != cached_tick:
+        cached_iso = datetime.fromtimestamp(now).isoformat()
+        _cached = (tick, cached_iso)
+    return cached_iso
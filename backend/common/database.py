@@ -1,12 +1,19 @@
-import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, PoolError, connect
+from mysql.connector.pooling import MySQLConnectionPool, CNX_POOL_MAXSIZE
 import logging
 from contextlib import contextmanager
 import os
+import threading
+import time
+from datetime import datetime
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# 连接池耗尽时等待空闲连接的最长时间(秒), 超时后改为直接建立一个不入池的连接
+POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 2))
+POOL_WAIT_INTERVAL = 0.01
+
 class DatabaseManager:
     def __init__(self, database_url=None):
         if database_url:
@@ -30,12 +37,46 @@ class DatabaseManager:
                 'charset': 'utf8mb4',
                 'autocommit': True
             }
+        
+        # mysql-connector的连接池大小只能在1..CNX_POOL_MAXSIZE(32)之间, 超出范围时建池会直接失败
+        self.pool_size = min(max(int(os.getenv('DB_POOL_SIZE', 20)), 1), CNX_POOL_MAXSIZE)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self):
+        """延迟创建连接池, 避免数据库不可用时实例化失败"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = MySQLConnectionPool(
+                        pool_name=f"multiproto_{id(self)}",
+                        pool_size=self.pool_size,
+                        pool_reset_session=False,
+                        **self.config
+                    )
+        return self._pool
+    
+    def _acquire(self):
+        """从连接池取连接; 池耗尽时get_connection()会立即抛出PoolError, 这里短暂等待空闲连接,
+        超时仍未取到则直接建立连接, 保证并发突增时请求不会因连接池大小而失败"""
+        pool = self._get_pool()
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        while True:
+            try:
+                return pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(POOL_WAIT_INTERVAL)
+        
+        logger.warning(f"Database pool exhausted ({self.pool_size}), opening a direct connection")
+        return connect(**self.config)
     
     @contextmanager
     def get_connection(self):
         connection = None
         try:
-            connection = mysql.connector.connect(**self.config)
+            connection = self._acquire()
             yield connection
         except Error as e:
             logger.error(f"Database connection error: {e}")
@@ -43,7 +84,8 @@ class DatabaseManager:
                 connection.rollback()
             raise
         finally:
-            if connection and connection.is_connected():
+            # 池化连接的close()会将连接归还到连接池, 直接建立的连接则被关闭
+            if connection:
                 connection.close()
     
     def execute_query(self, query, params=None):
@@ -53,6 +95,23 @@ class DatabaseManager:
             cursor.execute(query, params or ())
             return cursor.fetchall()
     
+    def execute_query_iter(self, query, params=None, chunk=1000, dictionary=False):
+        """流式执行查询, 使用非缓冲游标按chunk逐批读取并逐行返回"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor(buffered=False, dictionary=dictionary)
+            try:
+                cursor.execute(query, params or ())
+                while True:
+                    rows = cursor.fetchmany(chunk)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                # 调用方提前停止迭代时丢弃剩余结果, 保证连接可安全归还
+                if conn.unread_result:
+                    conn.consume_results()
+                cursor.close()
+    
     def execute_update(self, query, params=None):
         """执行更新操作"""
         with self.get_connection() as conn:
@@ -69,6 +128,44 @@ class DatabaseManager:
             conn.commit()
             return cursor.lastrowid
     
+    def execute_many(self, query, seq_of_params, chunk_size=1000):
+        """批量执行同一语句, 按chunk_size分批发送并返回影响的总行数"""
+        seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return 0
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            rowcount = 0
+            for start in range(0, len(seq_of_params), chunk_size):
+                cursor.executemany(query, seq_of_params[start:start + chunk_size])
+                rowcount += cursor.rowcount
+            conn.commit()
+            return rowcount
+    
+    def bulk_insert_results(self, results, chunk_size=1000):
+        """批量插入CollectionResult采集结果"""
+        query = (
+            "INSERT INTO collection_results "
+            "(task_id, server_id, execution_id, status, result_data, error_message, execution_time, collected_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+        )
+        now = datetime.now()
+        rows = []
+        for result in results:
+            data = result.to_dict()
+            rows.append((
+                data['task_id'],
+                data['server_id'],
+                data['execution_id'],
+                data['status'],
+                data['result_data'],
+                data['error_message'],
+                data['execution_time'],
+                result.collected_at or now
+            ))
+        return self.execute_many(query, rows, chunk_size)
+    
     def test_connection(self):
         """测试数据库连接"""
         try:
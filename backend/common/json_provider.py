@@ -0,0 +1,15 @@
+from flask.json.provider import DefaultJSONProvider
+import orjson
+
+class OrjsonProvider(DefaultJSONProvider):
+    """使用orjson作为JSON编解码实现, jsonify与request.get_json均经过此处"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,28 @@
+import logging
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+import queue
+import atexit
+import os
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def setup_logging(log_file):
+    """配置根日志: 调用线程只将日志放入队列, 由后台监听线程负责写文件和控制台, 返回监听器
+    
+    gunicorn的多个worker进程写同一个日志文件, 进程内轮转会互相覆盖和截断, 因此只追加写入,
+    轮转交给外部logrotate; WatchedFileHandler发现文件被移走后自动重新打开
+    """
+    log_formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = WatchedFileHandler(log_file)
+    file_handler.setFormatter(log_formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(log_formatter)
+    
+    log_queue = queue.Queue(-1)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root_logger.addHandler(QueueHandler(log_queue))
+    log_listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    return log_listener
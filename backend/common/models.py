@@ -1,8 +1,16 @@
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
-import json
+import orjson
+
+def _json_dumps(value: Any) -> str:
+    """序列化JSON字段"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+def _shallow_dict(obj: Any) -> Dict[str, Any]:
+    """浅拷贝数据类字段, 避免asdict对嵌套字段的递归深拷贝"""
+    return {name: getattr(obj, name) for name in obj.__dataclass_fields__}
 
 class ProtocolType(Enum):
     SSH = "ssh"
@@ -50,6 +58,23 @@ class ConnectionStatus(Enum):
     DISCONNECTED = "disconnected"
     ERROR = "error"
 
+# 枚举值查找表, 反序列化时以字典查找替代Enum()调用
+_PROTOCOL_TYPE_LOOKUP = {member.value: member for member in ProtocolType}
+_MANAGEMENT_TYPE_LOOKUP = {member.value: member for member in ManagementType}
+_SERVER_STATUS_LOOKUP = {member.value: member for member in ServerStatus}
+_TASK_TYPE_LOOKUP = {member.value: member for member in TaskType}
+_TASK_STATUS_LOOKUP = {member.value: member for member in TaskStatus}
+_RESULT_STATUS_LOOKUP = {member.value: member for member in ResultStatus}
+_LOG_LEVEL_LOOKUP = {member.value: member for member in LogLevel}
+_CONNECTION_STATUS_LOOKUP = {member.value: member for member in ConnectionStatus}
+
+def _lookup_enum(lookup, enum_cls, value):
+    """按值查找枚举成员, 未知值与Enum(value)一样抛出ValueError"""
+    member = lookup.get(value)
+    if member is None:
+        raise ValueError(f"{value!r} is not a valid {enum_cls.__name__}")
+    return member
+
 @dataclass
 class Server:
     """服务器模型"""
@@ -69,7 +94,7 @@ class Server:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理枚举类型
         if isinstance(self.protocol_type, ProtocolType):
             data['protocol_type'] = self.protocol_type.value
@@ -89,11 +114,11 @@ class Server:
         """从字典创建实例"""
         # 处理枚举类型
         if 'protocol_type' in data and isinstance(data['protocol_type'], str):
-            data['protocol_type'] = ProtocolType(data['protocol_type'])
+            data['protocol_type'] = _lookup_enum(_PROTOCOL_TYPE_LOOKUP, ProtocolType, data['protocol_type'])
         if 'management_type' in data and isinstance(data['management_type'], str):
-            data['management_type'] = ManagementType(data['management_type'])
+            data['management_type'] = _lookup_enum(_MANAGEMENT_TYPE_LOOKUP, ManagementType, data['management_type'])
         if 'status' in data and isinstance(data['status'], str):
-            data['status'] = ServerStatus(data['status'])
+            data['status'] = _lookup_enum(_SERVER_STATUS_LOOKUP, ServerStatus, data['status'])
         # 处理日期时间
         if 'created_at' in data and isinstance(data['created_at'], str):
             data['created_at'] = datetime.fromisoformat(data['created_at'])
@@ -125,7 +150,7 @@ class CollectionTask:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理枚举类型
         if isinstance(self.task_type, TaskType):
             data['task_type'] = self.task_type.value
@@ -133,9 +158,9 @@ class CollectionTask:
             data['status'] = self.status.value
         # 处理JSON字段
         if self.task_config:
-            data['task_config'] = json.dumps(self.task_config) if isinstance(self.task_config, dict) else self.task_config
+            data['task_config'] = _json_dumps(self.task_config) if isinstance(self.task_config, dict) else self.task_config
         if self.schedule_config:
-            data['schedule_config'] = json.dumps(self.schedule_config) if isinstance(self.schedule_config, dict) else self.schedule_config
+            data['schedule_config'] = _json_dumps(self.schedule_config) if isinstance(self.schedule_config, dict) else self.schedule_config
         # 处理日期时间
         for field in ['last_run_at', 'next_run_at', 'created_at', 'updated_at']:
             if getattr(self, field):
@@ -147,14 +172,14 @@ class CollectionTask:
         """从字典创建实例"""
         # 处理枚举类型
         if 'task_type' in data and isinstance(data['task_type'], str):
-            data['task_type'] = TaskType(data['task_type'])
+            data['task_type'] = _lookup_enum(_TASK_TYPE_LOOKUP, TaskType, data['task_type'])
         if 'status' in data and isinstance(data['status'], str):
-            data['status'] = TaskStatus(data['status'])
+            data['status'] = _lookup_enum(_TASK_STATUS_LOOKUP, TaskStatus, data['status'])
         # 处理JSON字段
         if 'task_config' in data and isinstance(data['task_config'], str):
-            data['task_config'] = json.loads(data['task_config'])
+            data['task_config'] = orjson.loads(data['task_config'])
         if 'schedule_config' in data and isinstance(data['schedule_config'], str):
-            data['schedule_config'] = json.loads(data['schedule_config'])
+            data['schedule_config'] = orjson.loads(data['schedule_config'])
         # 处理日期时间
         for field in ['last_run_at', 'next_run_at', 'created_at', 'updated_at']:
             if field in data and isinstance(data[field], str):
@@ -177,13 +202,13 @@ class CollectionResult:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理枚举类型
         if isinstance(self.status, ResultStatus):
             data['status'] = self.status.value
         # 处理JSON字段
         if self.result_data:
-            data['result_data'] = json.dumps(self.result_data) if isinstance(self.result_data, dict) else self.result_data
+            data['result_data'] = _json_dumps(self.result_data) if isinstance(self.result_data, dict) else self.result_data
         # 处理日期时间
         if self.collected_at:
             data['collected_at'] = self.collected_at.isoformat()
@@ -196,10 +221,10 @@ class CollectionResult:
         """从字典创建实例"""
         # 处理枚举类型
         if 'status' in data and isinstance(data['status'], str):
-            data['status'] = ResultStatus(data['status'])
+            data['status'] = _lookup_enum(_RESULT_STATUS_LOOKUP, ResultStatus, data['status'])
         # 处理JSON字段
         if 'result_data' in data and isinstance(data['result_data'], str):
-            data['result_data'] = json.loads(data['result_data'])
+            data['result_data'] = orjson.loads(data['result_data'])
         # 处理日期时间
         if 'collected_at' in data and isinstance(data['collected_at'], str):
             data['collected_at'] = datetime.fromisoformat(data['collected_at'])
@@ -219,13 +244,13 @@ class SystemLog:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理枚举类型
         if isinstance(self.level, LogLevel):
             data['level'] = self.level.value
         # 处理JSON字段
         if self.context:
-            data['context'] = json.dumps(self.context) if isinstance(self.context, dict) else self.context
+            data['context'] = _json_dumps(self.context) if isinstance(self.context, dict) else self.context
         # 处理日期时间
         if self.created_at:
             data['created_at'] = self.created_at.isoformat()
@@ -236,10 +261,10 @@ class SystemLog:
         """从字典创建实例"""
         # 处理枚举类型
         if 'level' in data and isinstance(data['level'], str):
-            data['level'] = LogLevel(data['level'])
+            data['level'] = _lookup_enum(_LOG_LEVEL_LOOKUP, LogLevel, data['level'])
         # 处理JSON字段
         if 'context' in data and isinstance(data['context'], str):
-            data['context'] = json.loads(data['context'])
+            data['context'] = orjson.loads(data['context'])
         # 处理日期时间
         if 'created_at' in data and isinstance(data['created_at'], str):
             data['created_at'] = datetime.fromisoformat(data['created_at'])
@@ -260,7 +285,7 @@ class ConnectionSession:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理枚举类型
         if isinstance(self.status, ConnectionStatus):
             data['status'] = self.status.value
@@ -275,7 +300,7 @@ class ConnectionSession:
         """从字典创建实例"""
         # 处理枚举类型
         if 'status' in data and isinstance(data['status'], str):
-            data['status'] = ConnectionStatus(data['status'])
+            data['status'] = _lookup_enum(_CONNECTION_STATUS_LOOKUP, ConnectionStatus, data['status'])
         # 处理日期时间
         for field in ['connected_at', 'disconnected_at', 'last_activity_at']:
             if field in data and isinstance(data[field], str):
@@ -295,10 +320,10 @@ class PerformanceMetric:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = _shallow_dict(self)
         # 处理JSON字段
         if self.tags:
-            data['tags'] = json.dumps(self.tags) if isinstance(self.tags, dict) else self.tags
+            data['tags'] = _json_dumps(self.tags) if isinstance(self.tags, dict) else self.tags
         # 处理日期时间
         if self.collected_at:
             data['collected_at'] = self.collected_at.isoformat()
@@ -309,7 +334,7 @@ class PerformanceMetric:
         """从字典创建实例"""
         # 处理JSON字段
         if 'tags' in data and isinstance(data['tags'], str):
-            data['tags'] = json.loads(data['tags'])
+            data['tags'] = orjson.loads(data['tags'])
         # 处理日期时间
         if 'collected_at' in data and isinstance(data['collected_at'], str):
             data['collected_at'] = datetime.fromisoformat(data['collected_at'])
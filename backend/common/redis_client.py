@@ -1,36 +1,81 @@
 import redis
-import json
+import orjson
 import logging
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import os
+import threading
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# 进程内共享的连接池, 按(host, port, db)复用; 安装hiredis后redis-py自动使用C解析器
+_pools: Dict[tuple, redis.ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+# 值的类型标记, 读取时按首字节分派解析, 避免逐个尝试JSON解析
+_STR_PREFIX = '\x00'
+_JSON_PREFIX = '\x01'
+
+def _get_pool(host: str, port: int, db: int) -> redis.ConnectionPool:
+    """获取或创建共享连接池"""
+    key = (host, port, db)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = redis.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 64)),
+                decode_responses=True
+            )
+            _pools[key] = pool
+        return pool
+
 class RedisClient:
     def __init__(self, redis_url=None):
         if redis_url:
             parsed = urlparse(redis_url)
-            self.client = redis.Redis(
-                host=parsed.hostname,
-                port=parsed.port or 6379,
-                db=int(parsed.path.lstrip('/')) if parsed.path else 0,
-                decode_responses=True
+            pool = _get_pool(
+                parsed.hostname,
+                parsed.port or 6379,
+                int(parsed.path.lstrip('/')) if parsed.path.lstrip('/') else 0
             )
         else:
-            self.client = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                db=int(os.getenv('REDIS_DB', 0)),
-                decode_responses=True
+            pool = _get_pool(
+                os.getenv('REDIS_HOST', 'localhost'),
+                int(os.getenv('REDIS_PORT', 6379)),
+                int(os.getenv('REDIS_DB', 0))
             )
+        self.client = redis.Redis(connection_pool=pool)
+    
+    def _dumps(self, value: Any) -> str:
+        """序列化写入的值, 首字节标记类型: 字符串原样保存, 其余类型编码为JSON"""
+        if isinstance(value, str):
+            return _STR_PREFIX + value
+        return _JSON_PREFIX + orjson.dumps(value).decode('utf-8')
+    
+    def _loads(self, value: Any) -> Any:
+        """根据类型标记反序列化读取到的值"""
+        if value is None:
+            return None
+        
+        prefix = value[:1]
+        if prefix == _JSON_PREFIX:
+            return orjson.loads(value[1:])
+        if prefix == _STR_PREFIX:
+            return value[1:]
+        
+        # 兼容未带类型标记的旧数据
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return value
     
     def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
         """设置键值对"""
         try:
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            return self.client.set(key, value, ex=ex)
+            return self.client.set(key, self._dumps(value), ex=ex)
         except Exception as e:
             logger.error(f"Redis set error: {e}")
             return False
@@ -38,19 +83,47 @@ class RedisClient:
     def get(self, key: str) -> Any:
         """获取值"""
         try:
-            value = self.client.get(key)
-            if value is None:
-                return None
-            
-            # 尝试解析JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            return self._loads(self.client.get(key))
         except Exception as e:
             logger.error(f"Redis get error: {e}")
             return None
     
+    def get_with_ttl(self, key: str) -> Tuple[Any, Optional[float]]:
+        """获取值及其剩余过期时间(秒), 通过管道一次往返完成; 键不存在或未设置过期时间时剩余时间为None"""
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = pipe.execute()
+            return self._loads(value), (pttl / 1000 if pttl is not None and pttl >= 0 else None)
+        except Exception as e:
+            logger.error(f"Redis get error: {e}")
+            return None, None
+    
+    def mset(self, mapping: Dict[str, Any], ex: Optional[int] = None) -> bool:
+        """批量设置键值对, 通过管道一次往返完成"""
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self._dumps(value), ex=ex)
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis mset error: {e}")
+            return False
+    
+    def mget(self, keys: List[str]) -> List[Any]:
+        """批量获取值, 不存在的键返回None"""
+        try:
+            return [self._loads(value) for value in self.client.mget(keys)]
+        except Exception as e:
+            logger.error(f"Redis mget error: {e}")
+            return [None] * len(keys)
+    
+    def pipeline(self, transaction: bool = False):
+        """创建管道, 用于合并多条命令的网络往返"""
+        return self.client.pipeline(transaction=transaction)
+    
     def delete(self, key: str) -> bool:
         """删除键"""
         try:
@@ -70,13 +143,7 @@ class RedisClient:
     def lpush(self, key: str, *values) -> int:
         """向列表左侧推入值"""
         try:
-            serialized_values = []
-            for value in values:
-                if isinstance(value, (dict, list)):
-                    serialized_values.append(json.dumps(value))
-                else:
-                    serialized_values.append(str(value))
-            return self.client.lpush(key, *serialized_values)
+            return self.client.lpush(key, *[self._dumps(value) for value in values])
         except Exception as e:
             logger.error(f"Redis lpush error: {e}")
             return 0
@@ -84,15 +151,7 @@ class RedisClient:
     def rpop(self, key: str) -> Any:
         """从列表右侧弹出值"""
         try:
-            value = self.client.rpop(key)
-            if value is None:
-                return None
-            
-            # 尝试解析JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            return self._loads(self.client.rpop(key))
         except Exception as e:
             logger.error(f"Redis rpop error: {e}")
             return None
@@ -105,6 +164,40 @@ class RedisClient:
             logger.error(f"Redis llen error: {e}")
             return 0
     
+    def hset(self, key: str, field: str, value: Any) -> bool:
+        """设置哈希表字段"""
+        try:
+            self.client.hset(key, field, self._dumps(value))
+            return True
+        except Exception as e:
+            logger.error(f"Redis hset error: {e}")
+            return False
+    
+    def hgetall(self, key: str) -> Optional[Dict[str, Any]]:
+        """获取哈希表全部字段; 读取失败返回None以区别于空哈希表, 无法解析的字段保留原始字符串, 不影响其余字段"""
+        try:
+            raw = self.client.hgetall(key)
+        except Exception as e:
+            logger.error(f"Redis hgetall error: {e}")
+            return None
+        
+        result = {}
+        for field, value in raw.items():
+            try:
+                result[field] = self._loads(value)
+            except ValueError as e:
+                logger.error(f"Redis hgetall decode error for field {field}: {e}")
+                result[field] = value
+        return result
+    
+    def hdel(self, key: str, *fields) -> Optional[int]:
+        """删除哈希表字段, 返回实际删除的字段数; 出错时返回None以区别于字段不存在"""
+        try:
+            return self.client.hdel(key, *fields)
+        except Exception as e:
+            logger.error(f"Redis hdel error: {e}")
+            return None
+    
     def ping(self) -> bool:
         """测试连接"""
         try:
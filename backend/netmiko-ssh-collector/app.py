@@ -1,68 +1,223 @@
+# gevent必须在其他模块导入前打补丁, 使netmiko底层的套接字与等待变为协程调度
+from gevent import monkey
+monkey.patch_all()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from gevent.pywsgi import WSGIServer
 from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
+from netmiko.utilities import get_structured_data_textfsm, get_template_dir
+from textfsm import TextFSM, clitable
 import logging
 from datetime import datetime
 import os
+import sys
 import threading
+import time
+import functools
+import hashlib
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/netmiko_ssh_collector.log'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志: 请求线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/netmiko_ssh_collector.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-# 线程池
-executor = ThreadPoolExecutor(max_workers=10)
+# 批量执行时并发操作的最大连接数
+MAX_PARALLEL_SESSIONS = int(os.getenv('NETMIKO_MAX_SESSIONS', 50))
+
+# 连接表分段锁数量, 须为2的幂
+LOCK_STRIPES = 32
+
+# 空闲连接回收: 超过IDLE_TTL秒未使用的连接将被关闭, 每SCAN_INTERVAL秒扫描一次
+IDLE_TTL = int(os.getenv('NETMIKO_IDLE_TTL', 600))
+SCAN_INTERVAL = int(os.getenv('NETMIKO_SCAN_INTERVAL', 30))
+
+# 自动连接模式下每个设备保留的空闲连接上限
+IDLE_POOL_SIZE = int(os.getenv('NETMIKO_IDLE_POOL_SIZE', 4))
+
+@functools.lru_cache(maxsize=1)
+def _textfsm_index():
+    """加载TextFSM模板索引(ntc-templates), 返回(CliTable, 模板目录)"""
+    template_dir = get_template_dir()
+    return clitable.CliTable(os.path.join(template_dir, 'index'), template_dir), template_dir
+
+@functools.lru_cache(maxsize=256)
+def _compiled_fsm(platform, command):
+    """按(平台, 命令)编译并缓存TextFSM模板; 未匹配或需多模板合并时返回None"""
+    cli_table, template_dir = _textfsm_index()
+    row_idx = cli_table.index.GetRowMatch({'Platform': platform, 'Command': command})
+    if not row_idx:
+        return None
+    
+    templates = cli_table.index.index[row_idx]['Template'].split(':')
+    if len(templates) != 1:
+        return None
+    
+    with open(os.path.join(template_dir, templates[0])) as f:
+        # TextFSM对象解析时有内部状态, 配一把锁串行使用
+        return TextFSM(f), threading.Lock()
+
+def parse_textfsm(platform, command, raw_output):
+    """使用缓存的TextFSM模板解析命令输出, 结果与netmiko的use_textfsm=True一致"""
+    command = command.strip()
+    compiled = _compiled_fsm(platform, command)
+    if compiled is None:
+        return get_structured_data_textfsm(raw_output, platform=platform, command=command)
+    
+    fsm, lock = compiled
+    with lock:
+        fsm.Reset()
+        rows = fsm.ParseText(raw_output)
+        header = [name.lower() for name in fsm.header]
+    
+    structured = [dict(zip(header, row)) for row in rows]
+    if structured:
+        return structured
+    # 与netmiko一致: cisco_xe无结果时按cisco_ios模板重试, 仍无结果返回原始输出
+    if 'cisco_xe' in platform:
+        return parse_textfsm('cisco_ios', command, raw_output)
+    return raw_output
+
+def make_connection_id(display_name):
+    """由连接描述生成定长(16位十六进制)的连接ID, 作为连接表的键"""
+    return hashlib.blake2b(display_name.encode('utf-8'), digest_size=8).hexdigest()
+
+@dataclass(frozen=True)
+class ConnEntry:
+    """活动连接记录(不可变快照), lock串行化同一连接上的通道操作"""
+    connection: object
+    device_config: MappingProxyType
+    created_at: str
+    display_name: str
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
 class NetmikoSSHCollector:
-    def __init__(self):
+    def __init__(self, idle_ttl=IDLE_TTL, scan_interval=SCAN_INTERVAL):
         self.active_connections = {}
-        self.lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        # 连接最近使用时间(time.monotonic), 单独存放以保持ConnEntry不可变
+        self._last_used = {}
+        self.idle_ttl = idle_ttl
+        self.scan_interval = scan_interval
+        # 自动连接模式的空闲连接池: 池键 -> deque[(connection, 归还时间)], 右端为最近归还
+        self._idle = {}
+        self._idle_lock = threading.Lock()
+        threading.Thread(target=self._reaper, name='netmiko-reaper', daemon=True).start()
+    
+    def _stripe(self, connection_id):
+        """按connection_id选择分段锁, 仅用于连接表的写操作"""
+        return self._stripes[hash(connection_id) & (LOCK_STRIPES - 1)]
+    
+    def _reaper(self):
+        """后台回收已断开或长时间空闲的连接"""
+        while True:
+            time.sleep(self.scan_interval)
+            try:
+                self._reap_once()
+            except Exception as e:
+                logger.error(f"Connection reaper failed: {str(e)}")
+    
+    def _reap_once(self):
+        now = time.monotonic()
+        
+        expired = []
+        with self._idle_lock:
+            for key, idle in list(self._idle.items()):
+                while idle and now - idle[0][1] >= self.idle_ttl:
+                    expired.append(idle.popleft()[0])
+                if not idle:
+                    del self._idle[key]
+        for connection in expired:
+            self._close(connection)
+        
+        for connection_id, entry in list(self.active_connections.items()):
+            # 正在执行命令的连接不探测也不回收, 留待下一轮; 持有连接锁直到回收完成, 命令无法在此期间开始
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                idle = now - self._last_used.get(connection_id, now)
+                if idle < self.idle_ttl and entry.connection.is_alive():
+                    continue
+                
+                with self._stripe(connection_id):
+                    # 扫描期间连接可能已被替换或断开, 只移除同一条记录
+                    if self.active_connections.get(connection_id) is not entry:
+                        continue
+                    del self.active_connections[connection_id]
+                    self._last_used.pop(connection_id, None)
+                
+                logger.info(f"Reaping Netmiko connection {entry.display_name} (idle {idle:.0f}s)")
+                try:
+                    entry.connection.disconnect()
+                except Exception as e:
+                    logger.error(f"Disconnect failed: {str(e)}")
+            finally:
+                entry.lock.release()
+    
+    def _touch(self, connection_id, entry):
+        """在连接锁内调用: 连接仍在表中时刷新最近使用时间并返回True; 已被回收、断开或替换时不再写入"""
+        with self._stripe(connection_id):
+            if self.active_connections.get(connection_id) is not entry:
+                return False
+            self._last_used[connection_id] = time.monotonic()
+            return True
+    
+    def _build_device(self, device_config):
+        """由请求参数生成ConnectHandler参数"""
+        device = {
+            'device_type': device_config.get('device_type', 'cisco_ios'),
+            'host': device_config['host'],
+            'port': device_config.get('port', 22),
+            'username': device_config['username'],
+            'password': device_config['password'],
+            'timeout': device_config.get('timeout', 30),
+            'session_timeout': device_config.get('session_timeout', 60),
+            'banner_timeout': device_config.get('banner_timeout', 15),
+            'conn_timeout': device_config.get('conn_timeout', 10)
+        }
+        
+        # 可选参数
+        if 'secret' in device_config:
+            device['secret'] = device_config['secret']
+        if 'global_delay_factor' in device_config:
+            device['global_delay_factor'] = device_config['global_delay_factor']
+        
+        return device
     
     def connect(self, device_config):
-        """建立Netmiko SSH连接"""
+        """建立Netmiko SSH连接, 返回连接ID与可读的连接名"""
         try:
             # 设备配置
-            device = {
-                'device_type': device_config.get('device_type', 'cisco_ios'),
-                'host': device_config['host'],
-                'port': device_config.get('port', 22),
-                'username': device_config['username'],
-                'password': device_config['password'],
-                'timeout': device_config.get('timeout', 30),
-                'session_timeout': device_config.get('session_timeout', 60),
-                'banner_timeout': device_config.get('banner_timeout', 15),
-                'conn_timeout': device_config.get('conn_timeout', 10)
-            }
-            
-            # 可选参数
-            if 'secret' in device_config:
-                device['secret'] = device_config['secret']
-            if 'global_delay_factor' in device_config:
-                device['global_delay_factor'] = device_config['global_delay_factor']
+            device = self._build_device(device_config)
             
             connection = ConnectHandler(**device)
             
-            connection_id = f"{device['host']}:{device['port']}:{device['username']}:{device['device_type']}"
+            display_name = f"{device['host']}:{device['port']}:{device['username']}:{device['device_type']}"
+            connection_id = make_connection_id(display_name)
             
-            with self.lock:
-                self.active_connections[connection_id] = {
-                    'connection': connection,
-                    'device_config': device_config,
-                    'created_at': datetime.now().isoformat()
-                }
+            # 记录一经发布即不再修改, 读路径无需加锁; 更新时整体替换
+            entry = ConnEntry(
+                connection,
+                MappingProxyType(dict(device_config)),
+                datetime.now().isoformat(),
+                display_name
+            )
+            with self._stripe(connection_id):
+                self.active_connections[connection_id] = entry
+                self._last_used[connection_id] = time.monotonic()
             
-            return connection_id, None
+            return {'connection_id': connection_id, 'display_name': display_name}, None
             
         except NetmikoTimeoutException as e:
             logger.error(f"Netmiko timeout: {str(e)}")
@@ -74,50 +229,166 @@ class NetmikoSSHCollector:
             logger.error(f"Netmiko connection failed: {str(e)}")
             return None, str(e)
     
-    def execute_command(self, connection_id, command, use_textfsm=False):
-        """执行命令"""
+    def _pool_key(self, device):
+        """空闲连接池键; 密码只以摘要参与, 凭据不同的请求不会复用已认证的会话"""
+        digest = hashlib.blake2b(device['password'].encode('utf-8'), digest_size=8).hexdigest()
+        return (device['host'], device['port'], device['username'], device['device_type'], digest)
+    
+    def _checkout(self, key):
+        """从空闲池取出最近归还的连接, 没有时返回None"""
+        with self._idle_lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()[0]
+        return None
+    
+    def _checkin(self, key, connection):
+        """归还连接到空闲池, 池已满时直接断开"""
+        with self._idle_lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle) < IDLE_POOL_SIZE:
+                idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+    
+    def _close(self, connection):
+        try:
+            connection.disconnect()
+        except Exception as e:
+            logger.error(f"Disconnect failed: {str(e)}")
+    
+    def execute_auto(self, device_config, command, use_textfsm=False, timestamp=None):
+        """自动连接模式执行命令: 优先复用同一设备的空闲连接, 没有时新建, 完成后归还连接池"""
+        try:
+            device = self._build_device(device_config)
+            key = self._pool_key(device)
+            
+            connection = self._checkout(key)
+            reused = connection is not None
+            while True:
+                if connection is None:
+                    # 新建连接在锁外进行, 不同设备的握手互不阻塞
+                    connection = ConnectHandler(**device)
+                try:
+                    output = connection.send_command(command)
+                    break
+                except Exception:
+                    # 出错的连接状态未知, 不再归还连接池
+                    self._close(connection)
+                    if not reused:
+                        raise
+                    # 空闲连接可能已被设备关闭, 新建连接重试一次
+                    connection = None
+                    reused = False
+            
+            self._checkin(key, connection)
+            
+            if use_textfsm:
+                output = parse_textfsm(device['device_type'], command, output)
+            
+            return {
+                'command': command,
+                'output': output,
+                'use_textfsm': use_textfsm,
+                'reused': reused,
+                'timestamp': timestamp or datetime.now().isoformat()
+            }, None
+            
+        except NetmikoTimeoutException as e:
+            logger.error(f"Netmiko timeout: {str(e)}")
+            return None, f"Connection timeout: {str(e)}"
+        except NetmikoAuthenticationException as e:
+            logger.error(f"Netmiko authentication failed: {str(e)}")
+            return None, f"Authentication failed: {str(e)}"
+        except Exception as e:
+            logger.error(f"Command execution failed: {str(e)}")
+            return None, str(e)
+    
+    def execute_command(self, connection_id, command, use_textfsm=False, timestamp=None):
+        """执行命令, timestamp由调用方传入时复用同一时间戳"""
         try:
-            with self.lock:
-                conn_info = self.active_connections.get(connection_id)
+            entry = self.active_connections.get(connection_id)
             
-            if not conn_info:
+            if not entry:
                 return None, "Connection not found"
             
-            connection = conn_info['connection']
+            # 执行命令, 开始和结束时都刷新最近使用时间
+            with entry.lock:
+                if not self._touch(connection_id, entry):
+                    return None, "Connection not found"
+                try:
+                    output = entry.connection.send_command(command)
+                finally:
+                    self._touch(connection_id, entry)
             
-            # 执行命令
+            # 模板解析在连接锁外进行, 编译结果按(平台, 命令)缓存
             if use_textfsm:
-                output = connection.send_command(command, use_textfsm=True)
-            else:
-                output = connection.send_command(command)
+                output = parse_textfsm(entry.connection.device_type, command, output)
             
             return {
                 'command': command,
                 'output': output,
                 'use_textfsm': use_textfsm,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': timestamp or datetime.now().isoformat()
             }, None
             
         except Exception as e:
             logger.error(f"Command execution failed: {str(e)}")
             return None, str(e)
     
+    def execute_many(self, items, timestamp=None):
+        """在多个连接上并发执行命令, 同一连接上的命令按顺序执行"""
+        timestamp = timestamp or datetime.now().isoformat()
+        results = [None] * len(items)
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(item['connection_id'], []).append((index, item))
+        
+        def run_group(entries):
+            for index, item in entries:
+                result, error = self.execute_command(
+                    item['connection_id'],
+                    item['command'],
+                    item.get('use_textfsm', False),
+                    timestamp
+                )
+                if error:
+                    results[index] = {
+                        'connection_id': item['connection_id'],
+                        'command': item['command'],
+                        'error': error
+                    }
+                else:
+                    results[index] = {
+                        'connection_id': item['connection_id'],
+                        'result': result
+                    }
+        
+        if groups:
+            with ThreadPoolExecutor(max_workers=min(len(groups), MAX_PARALLEL_SESSIONS)) as pool:
+                list(pool.map(run_group, groups.values()))
+        
+        return results
+    
     def execute_config_commands(self, connection_id, commands, exit_config_mode=True):
         """执行配置命令"""
         try:
-            with self.lock:
-                conn_info = self.active_connections.get(connection_id)
+            entry = self.active_connections.get(connection_id)
             
-            if not conn_info:
+            if not entry:
                 return None, "Connection not found"
             
-            connection = conn_info['connection']
-            
-            # 执行配置命令
-            output = connection.send_config_set(
-                commands, 
-                exit_config_mode=exit_config_mode
-            )
+            # 执行配置命令, 开始和结束时都刷新最近使用时间
+            with entry.lock:
+                if not self._touch(connection_id, entry):
+                    return None, "Connection not found"
+                try:
+                    output = entry.connection.send_config_set(
+                        commands, 
+                        exit_config_mode=exit_config_mode
+                    )
+                finally:
+                    self._touch(connection_id, entry)
             
             return {
                 'commands': commands,
@@ -133,12 +404,14 @@ class NetmikoSSHCollector:
     def disconnect(self, connection_id):
         """断开连接"""
         try:
-            with self.lock:
-                conn_info = self.active_connections.pop(connection_id, None)
+            with self._stripe(connection_id):
+                entry = self.active_connections.pop(connection_id, None)
+                self._last_used.pop(connection_id, None)
             
-            if conn_info:
-                connection = conn_info['connection']
-                connection.disconnect()
+            if entry:
+                # 等待该连接上正在执行的命令结束后再断开
+                with entry.lock:
+                    entry.connection.disconnect()
                 return True
             return False
             
@@ -149,13 +422,15 @@ class NetmikoSSHCollector:
     def get_device_info(self, connection_id):
         """获取设备信息"""
         try:
-            with self.lock:
-                conn_info = self.active_connections.get(connection_id)
+            entry = self.active_connections.get(connection_id)
             
-            if not conn_info:
+            if not entry:
                 return None, "Connection not found"
             
-            connection = conn_info['connection']
+            connection = entry.connection
+            
+            with entry.lock:
+                is_alive = connection.is_alive()
             
             # 获取基本信息
             info = {
@@ -163,9 +438,9 @@ class NetmikoSSHCollector:
                 'host': connection.host,
                 'port': connection.port,
                 'username': connection.username,
-                'is_alive': connection.is_alive(),
+                'is_alive': is_alive,
                 'base_prompt': connection.base_prompt,
-                'created_at': conn_info['created_at'],
+                'created_at': entry.created_at,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -175,6 +450,13 @@ class NetmikoSSHCollector:
             logger.error(f"Get device info failed: {str(e)}")
             return None, str(e)
 
+# 各接口的必填字段, 模块加载时构建一次
+CONNECT_FIELDS = frozenset(('host', 'username', 'password'))
+EXECUTE_FIELDS = frozenset(('connection_id', 'command'))
+EXECUTE_AUTO_FIELDS = frozenset(('host', 'username', 'password', 'command'))
+CONFIG_FIELDS = frozenset(('connection_id', 'commands'))
+CONNECTION_FIELDS = frozenset(('connection_id',))
+
 netmiko_collector = NetmikoSSHCollector()
 
 @app.route('/health', methods=['GET'])
@@ -191,17 +473,17 @@ def connect():
     """建立Netmiko SSH连接"""
     data = request.get_json()
     
-    required_fields = ['host', 'username', 'password']
-    if not all(field in data for field in required_fields):
+    if not CONNECT_FIELDS <= data.keys():
         return jsonify({'error': 'Missing required fields: host, username, password'}), 400
     
-    connection_id, error = netmiko_collector.connect(data)
+    connection, error = netmiko_collector.connect(data)
     
     if error:
         return jsonify({'error': error}), 500
     
     return jsonify({
-        'connection_id': connection_id,
+        'connection_id': connection['connection_id'],
+        'display_name': connection['display_name'],
         'status': 'connected',
         'timestamp': datetime.now().isoformat()
     })
@@ -211,7 +493,7 @@ def execute():
     """执行命令"""
     data = request.get_json()
     
-    if 'connection_id' not in data or 'command' not in data:
+    if not EXECUTE_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id or command'}), 400
     
     result, error = netmiko_collector.execute_command(
@@ -225,12 +507,52 @@ def execute():
     
     return jsonify(result)
 
+@app.route('/execute-auto', methods=['POST'])
+def execute_auto():
+    """自动连接模式执行命令, 无需预先调用/connect"""
+    data = request.get_json()
+    
+    if not EXECUTE_AUTO_FIELDS <= data.keys():
+        return jsonify({'error': 'Missing required fields: host, username, password, command'}), 400
+    
+    result, error = netmiko_collector.execute_auto(
+        data,
+        data['command'],
+        data.get('use_textfsm', False)
+    )
+    
+    if error:
+        return jsonify({'error': error}), 500
+    
+    return jsonify(result)
+
+@app.route('/execute-many', methods=['POST'])
+def execute_many():
+    """在多个连接上批量执行命令"""
+    data = request.get_json()
+    
+    commands = data.get('commands')
+    if not isinstance(commands, list) or not all(
+        isinstance(item, dict) and 'connection_id' in item and 'command' in item
+        for item in commands
+    ):
+        return jsonify({'error': 'Missing or invalid commands array'}), 400
+    
+    ts = datetime.now().isoformat()
+    results = netmiko_collector.execute_many(commands, ts)
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'timestamp': ts
+    })
+
 @app.route('/config', methods=['POST'])
 def config():
     """执行配置命令"""
     data = request.get_json()
     
-    if 'connection_id' not in data or 'commands' not in data:
+    if not CONFIG_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id or commands'}), 400
     
     result, error = netmiko_collector.execute_config_commands(
@@ -249,7 +571,7 @@ def disconnect():
     """断开连接"""
     data = request.get_json()
     
-    if 'connection_id' not in data:
+    if not CONNECTION_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id'}), 400
     
     success = netmiko_collector.disconnect(data['connection_id'])
@@ -267,7 +589,7 @@ def device_info():
     """获取设备信息"""
     data = request.get_json()
     
-    if 'connection_id' not in data:
+    if not CONNECTION_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id'}), 400
     
     info, error = netmiko_collector.get_device_info(data['connection_id'])
@@ -280,16 +602,19 @@ def device_info():
 @app.route('/connections', methods=['GET'])
 def list_connections():
     """列出活动连接"""
-    with netmiko_collector.lock:
-        connections = {}
-        for conn_id, conn_info in netmiko_collector.active_connections.items():
-            connections[conn_id] = {
-                'device_type': conn_info['device_config'].get('device_type', 'cisco_ios'),
-                'host': conn_info['device_config']['host'],
-                'port': conn_info['device_config'].get('port', 22),
-                'username': conn_info['device_config']['username'],
-                'created_at': conn_info['created_at']
-            }
+    # 复制快照后在锁外格式化, 不阻塞连接与命令执行
+    snapshot = list(netmiko_collector.active_connections.items())
+    
+    connections = {}
+    for conn_id, entry in snapshot:
+        connections[conn_id] = {
+            'device_type': entry.device_config.get('device_type', 'cisco_ios'),
+            'host': entry.device_config['host'],
+            'port': entry.device_config.get('port', 22),
+            'username': entry.device_config['username'],
+            'display_name': entry.display_name,
+            'created_at': entry.created_at
+        }
     
     return jsonify({
         'active_connections': connections,
@@ -302,4 +627,4 @@ if __name__ == '__main__':
     os.makedirs('logs', exist_ok=True)
     
     logger.info("Starting Netmiko SSH Collector...")
-    app.run(host='0.0.0.0', port=8021, debug=False)
\ No newline at end of file
+    WSGIServer(('0.0.0.0', 8021), app).serve_forever()
\ No newline at end of file
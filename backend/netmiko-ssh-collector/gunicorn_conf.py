@@ -0,0 +1,9 @@
+# Gunicorn配置: gevent协程worker
+# 活动连接保存在进程内存中, 多个worker之间不共享, 因此默认只启动一个worker
+import os
+
+bind = '0.0.0.0:8021'
+worker_class = 'gevent'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+worker_connections = 1000
+keepalive = 75
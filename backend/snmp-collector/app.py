@@ -1,82 +1,154 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from pysnmp.hlapi import *
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto.rfc1902 import Integer, Integer32, Counter32, Counter64, Gauge32, TimeTicks, Unsigned32, ObjectIdentifier
+from pysnmp.proto.rfc1905 import EndOfMibView
+import functools
 import logging
 from datetime import datetime
 import os
+import sys
 from concurrent.futures import ThreadPoolExecutor
 import threading
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/snmp_collector.log'),
-        logging.StreamHandler()
-    ]
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
+
+# 配置日志: 请求线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/snmp_collector.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-# 线程池
-executor = ThreadPoolExecutor(max_workers=10)
+# 线程池, 批量Get/Walk在此并发执行; SNMP以UDP等待为主, 线程数可以取大
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('SNMP_WORKERS', 64)))
+
+# Walk时每个GetBulk PDU请求的最大变量数
+DEFAULT_MAX_REPETITIONS = 25
+
+# 已解析OID缓存的容量上限
+OID_CACHE_SIZE = 4096
+
+# 数值型SMI类型, 直接以整数返回
+INTEGER_TYPES = (Integer, Integer32, Counter32, Counter64, Gauge32, TimeTicks, Unsigned32)
+# OID类型的值: 启用lookupMib时被解析为ObjectIdentity, 其prettyPrint返回MIB名称(如SNMPv2-SMI::enterprises.9),
+# 未解析时为ObjectIdentifier; 两者都按数字点分形式输出
+OID_TYPES = (ObjectIdentity, ObjectIdentifier)
+
+def format_value(value):
+    """转换SNMP值: 数值类型返回int, OID值保持数字形式, 其余(OCTET STRING/IpAddress等)使用prettyPrint"""
+    if isinstance(value, INTEGER_TYPES):
+        return int(value)
+    if isinstance(value, OID_TYPES):
+        return str(value)
+    return value.prettyPrint()
 
 class SNMPCollector:
     def __init__(self):
         self.lock = threading.Lock()
+        # 同步SnmpEngine非线程安全, 每个工作线程持有一个引擎及其传输目标缓存
+        self._local = threading.local()
+        self._community_cache = {}
+        self._oid_cache = {}
+    
+    def _engine(self):
+        """获取当前线程复用的SnmpEngine"""
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            engine = self._local.engine = SnmpEngine()
+            self._local.transport = functools.lru_cache(maxsize=1024)(self._make_transport)
+        return engine
     
-    def get_snmp_data(self, host, community, oid, port=161, timeout=10):
-        """获取SNMP数据"""
+    @staticmethod
+    def _make_transport(host, port, timeout):
+        return UdpTransportTarget((host, port), timeout=timeout)
+    
+    def _transport(self, host, port, timeout):
+        """获取当前线程缓存的UdpTransportTarget, 避免重复解析地址"""
+        self._engine()
+        return self._local.transport(host, port, timeout)
+    
+    def _object_type(self, oid):
+        """按OID缓存已完成MIB解析的ObjectType, 解析后的对象只读, 可跨线程共享"""
+        object_type = self._oid_cache.get(oid)
+        if object_type is None:
+            with self.lock:
+                object_type = self._oid_cache.get(oid)
+                if object_type is None:
+                    mib_view = CommandGeneratorVarBinds().getMibViewController(self._engine())
+                    object_type = ObjectType(ObjectIdentity(oid)).resolveWithMib(mib_view, ignoreErrors=False)
+                    if len(self._oid_cache) >= OID_CACHE_SIZE:
+                        self._oid_cache.clear()
+                    self._oid_cache[oid] = object_type
+        return object_type
+    
+    def _community(self, community):
+        """按community复用CommunityData"""
+        auth_data = self._community_cache.get(community)
+        if auth_data is None:
+            with self.lock:
+                auth_data = self._community_cache.get(community)
+                if auth_data is None:
+                    auth_data = self._community_cache[community] = CommunityData(community, mpModel=1)
+        return auth_data
+    
+    def get_snmp_data(self, host, community, oid, port=161, timeout=10, timestamp=None):
+        """获取SNMP数据, timestamp由调用方传入时复用同一时间戳"""
         try:
             iterator = getCmd(
-                SnmpEngine(),
-                CommunityData(community),
-                UdpTransportTarget((host, port), timeout=timeout),
+                self._engine(),
+                self._community(community),
+                self._transport(host, port, timeout),
                 ContextData(),
-                ObjectType(ObjectIdentity(oid))
+                self._object_type(oid)
             )
             
             errorIndication, errorStatus, errorIndex, varBinds = next(iterator)
             
-            if errorIndication:
-                return None, str(errorIndication)
-            elif errorStatus:
-                return None, f"{errorStatus.prettyPrint()} at {errorIndex and varBinds[int(errorIndex) - 1][0] or '?'}"
-            else:
-                result = []
-                for varBind in varBinds:
-                    oid_str = str(varBind[0])
-                    value = str(varBind[1])
-                    result.append({
-                        'oid': oid_str,
-                        'value': value
-                    })
-                
-                return {
-                    'host': host,
-                    'community': community,
-                    'data': result,
-                    'timestamp': datetime.now().isoformat()
-                }, None
+            return self._build_get_result(host, community, errorIndication, errorStatus, errorIndex, varBinds, timestamp)
                 
         except Exception as e:
             logger.error(f"SNMP get failed: {str(e)}")
             return None, str(e)
     
-    def walk_snmp_data(self, host, community, oid, port=161, timeout=10):
-        """SNMP Walk操作"""
+    def _build_get_result(self, host, community, errorIndication, errorStatus, errorIndex, varBinds, timestamp=None):
+        """将Get响应转换为结果字典"""
+        if errorIndication:
+            return None, str(errorIndication)
+        elif errorStatus:
+            return None, f"{errorStatus.prettyPrint()} at {errorIndex and varBinds[int(errorIndex) - 1][0] or '?'}"
+        
+        result = []
+        for varBind in varBinds:
+            result.append({
+                'oid': str(varBind[0]),
+                'value': format_value(varBind[1])
+            })
+        
+        return {
+            'host': host,
+            'community': community,
+            'data': result,
+            'timestamp': timestamp or datetime.now().isoformat()
+        }, None
+    
+    def walk_snmp_data(self, host, community, oid, port=161, timeout=10,
+                       max_repetitions=DEFAULT_MAX_REPETITIONS, timestamp=None):
+        """SNMP Walk操作, 使用GetBulk每个PDU批量取回max_repetitions个变量"""
         try:
             result = []
             
-            for (errorIndication, errorStatus, errorIndex, varBinds) in nextCmd(
-                SnmpEngine(),
-                CommunityData(community),
-                UdpTransportTarget((host, port), timeout=timeout),
+            for (errorIndication, errorStatus, errorIndex, varBinds) in bulkCmd(
+                self._engine(),
+                self._community(community),
+                self._transport(host, port, timeout),
                 ContextData(),
-                ObjectType(ObjectIdentity(oid)),
+                0, max_repetitions,
+                self._object_type(oid),
                 lexicographicMode=False
             ):
                 if errorIndication:
@@ -85,11 +157,12 @@ class SNMPCollector:
                     return None, f"{errorStatus.prettyPrint()} at {errorIndex and varBinds[int(errorIndex) - 1][0] or '?'}"
                 else:
                     for varBind in varBinds:
-                        oid_str = str(varBind[0])
-                        value = str(varBind[1])
+                        # GetBulk在子树末尾可能返回endOfMibView占位, 不计入结果
+                        if isinstance(varBind[1], EndOfMibView):
+                            continue
                         result.append({
-                            'oid': oid_str,
-                            'value': value
+                            'oid': str(varBind[0]),
+                            'value': format_value(varBind[1])
                         })
             
             return {
@@ -97,54 +170,60 @@ class SNMPCollector:
                 'community': community,
                 'data': result,
                 'count': len(result),
-                'timestamp': datetime.now().isoformat()
+                'timestamp': timestamp or datetime.now().isoformat()
             }, None
             
         except Exception as e:
             logger.error(f"SNMP walk failed: {str(e)}")
             return None, str(e)
     
-    def batch_collect(self, configs):
-        """批量收集SNMP数据"""
-        results = []
+    def batch_collect(self, configs, timestamp=None):
+        """批量收集SNMP数据, 各项在线程池中并发执行(每个线程使用自己的同步引擎), 整批结果共用一个时间戳"""
+        timestamp = timestamp or datetime.now().isoformat()
+        return list(executor.map(functools.partial(self._collect_one, timestamp=timestamp), configs))
+    
+    def _collect_one(self, config, timestamp):
+        """执行批量请求中的单个Get或Walk"""
+        operation = config.get('operation', 'get')
         
-        for config in configs:
-            operation = config.get('operation', 'get')
-            
-            if operation == 'get':
-                result, error = self.get_snmp_data(
-                    config['host'],
-                    config['community'],
-                    config['oid'],
-                    config.get('port', 161),
-                    config.get('timeout', 10)
-                )
-            elif operation == 'walk':
-                result, error = self.walk_snmp_data(
-                    config['host'],
-                    config['community'],
-                    config['oid'],
-                    config.get('port', 161),
-                    config.get('timeout', 10)
-                )
-            else:
-                error = f"Unknown operation: {operation}"
-                result = None
-            
-            if error:
-                results.append({
-                    'config': config,
-                    'error': error,
-                    'timestamp': datetime.now().isoformat()
-                })
-            else:
-                results.append({
-                    'config': config,
-                    'result': result,
-                    'timestamp': datetime.now().isoformat()
-                })
+        if operation == 'get':
+            result, error = self.get_snmp_data(
+                config['host'],
+                config['community'],
+                config['oid'],
+                config.get('port', 161),
+                config.get('timeout', 10),
+                timestamp
+            )
+        elif operation == 'walk':
+            result, error = self.walk_snmp_data(
+                config['host'],
+                config['community'],
+                config['oid'],
+                config.get('port', 161),
+                config.get('timeout', 10),
+                config.get('max_repetitions', DEFAULT_MAX_REPETITIONS),
+                timestamp
+            )
+        else:
+            error = f"Unknown operation: {operation}"
+            result = None
         
-        return results
+        if error:
+            return {
+                'config': config,
+                'error': error,
+                'timestamp': timestamp
+            }
+        return {
+            'config': config,
+            'result': result,
+            'timestamp': timestamp
+        }
+
+# 各接口的必填字段, 模块加载时构建一次
+SNMP_QUERY_FIELDS = frozenset(('host', 'community', 'oid'))
+SNMP_TARGET_FIELDS = frozenset(('host', 'community'))
 
 snmp_collector = SNMPCollector()
 
@@ -161,8 +240,7 @@ def snmp_get():
     """SNMP Get操作"""
     data = request.get_json()
     
-    required_fields = ['host', 'community', 'oid']
-    if not all(field in data for field in required_fields):
+    if not SNMP_QUERY_FIELDS <= data.keys():
         return jsonify({'error': 'Missing required fields: host, community, oid'}), 400
     
     result, error = snmp_collector.get_snmp_data(
@@ -183,8 +261,7 @@ def snmp_walk():
     """SNMP Walk操作"""
     data = request.get_json()
     
-    required_fields = ['host', 'community', 'oid']
-    if not all(field in data for field in required_fields):
+    if not SNMP_QUERY_FIELDS <= data.keys():
         return jsonify({'error': 'Missing required fields: host, community, oid'}), 400
     
     result, error = snmp_collector.walk_snmp_data(
@@ -192,7 +269,8 @@ def snmp_walk():
         data['community'],
         data['oid'],
         data.get('port', 161),
-        data.get('timeout', 10)
+        data.get('timeout', 10),
+        data.get('max_repetitions', DEFAULT_MAX_REPETITIONS)
     )
     
     if error:
@@ -222,12 +300,13 @@ def batch_collect():
     if 'configs' not in data or not isinstance(data['configs'], list):
         return jsonify({'error': 'Missing or invalid configs array'}), 400
     
-    results = snmp_collector.batch_collect(data['configs'])
+    ts = datetime.now().isoformat()
+    results = snmp_collector.batch_collect(data['configs'], ts)
     
     return jsonify({
         'results': results,
         'count': len(results),
-        'timestamp': datetime.now().isoformat()
+        'timestamp': ts
     })
 
 @app.route('/test-connection', methods=['POST'])
@@ -235,37 +314,39 @@ def test_connection():
     """测试SNMP连接"""
     data = request.get_json()
     
-    required_fields = ['host', 'community']
-    if not all(field in data for field in required_fields):
+    if not SNMP_TARGET_FIELDS <= data.keys():
         return jsonify({'error': 'Missing required fields: host, community'}), 400
     
     # 使用系统OID测试连接
     test_oid = '1.3.6.1.2.1.1.1.0'  # sysDescr
+    ts = datetime.now().isoformat()
     
     result, error = snmp_collector.get_snmp_data(
         data['host'],
         data['community'],
         test_oid,
         data.get('port', 161),
-        data.get('timeout', 5)
+        data.get('timeout', 5),
+        ts
     )
     
     if error:
         return jsonify({
             'connected': False,
             'error': error,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': ts
         })
     
     return jsonify({
         'connected': True,
         'system_description': result['data'][0]['value'] if result['data'] else 'N/A',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': ts
     })
 
 if __name__ == '__main__':
     # 确保日志目录存在
     os.makedirs('logs', exist_ok=True)
     
+    # 仅用于本地开发, 生产环境通过 gunicorn -c gunicorn_conf.py app:app 启动
     logger.info("Starting SNMP Collector...")
-    app.run(host='0.0.0.0', port=8030, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8030, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,12 @@
+# Gunicorn配置: 多进程 + gthread线程worker, SNMP采集无进程内状态, 可按CPU数扩展
+import os
+
+bind = '0.0.0.0:8030'
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+keepalive = 75
+
+# 监听套接字启用SO_REUSEPORT, 同机可再启动一组gunicorn实例绑定同一端口, 由内核分发连接
+# SNMP请求使用各worker自己的SnmpEngine与临时UDP端口, 响应直接回到发起进程, 无需共享端口
+reuse_port = True
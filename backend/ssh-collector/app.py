@@ -1,37 +1,105 @@
+# gevent必须在其他模块导入前打补丁, 使paramiko的套接字与传输线程变为协程调度
+from gevent import monkey
+monkey.patch_all()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from gevent.pywsgi import WSGIServer
 import paramiko
 import logging
 from datetime import datetime
 import os
+import sys
 import json
-from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
+import hashlib
+import codecs
+import select
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/ssh_collector.log'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志: 请求线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/ssh_collector.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-# 线程池
-executor = ThreadPoolExecutor(max_workers=10)
+# 连接表分段锁数量, 须为2的幂
+LOCK_STRIPES = 32
+
+# SSH传输层保活间隔(秒)
+KEEPALIVE_INTERVAL = 30
+
+# 读取命令输出时每次从通道接收的最大字节数
+READ_CHUNK = 65536
+
+# 空闲连接回收: 超过IDLE_TTL秒未使用的连接将被关闭, 每SCAN_INTERVAL秒扫描一次
+IDLE_TTL = int(os.getenv('SSH_IDLE_TTL', 600))
+SCAN_INTERVAL = int(os.getenv('SSH_SCAN_INTERVAL', 30))
+
+def make_connection_id(display_name):
+    """由连接描述生成定长(16位十六进制)的连接ID, 作为连接表的键"""
+    return hashlib.blake2b(display_name.encode('utf-8'), digest_size=8).hexdigest()
+
+@dataclass(frozen=True)
+class ConnEntry:
+    """活动连接记录(不可变快照), 命令通过transport并发打开独立通道执行"""
+    client: paramiko.SSHClient
+    transport: paramiko.Transport
+    display_name: str
 
 class SSHCollector:
-    def __init__(self):
+    def __init__(self, idle_ttl=IDLE_TTL, scan_interval=SCAN_INTERVAL):
         self.active_connections = {}
-        self.lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        # 连接最近使用时间(time.monotonic), 单独存放以保持ConnEntry不可变
+        self._last_used = {}
+        # 每个连接上正在执行的命令数, 有命令在执行的连接不按空闲回收
+        self._in_flight = {}
+        self.idle_ttl = idle_ttl
+        self.scan_interval = scan_interval
+        threading.Thread(target=self._reaper, name='ssh-reaper', daemon=True).start()
+    
+    def _stripe(self, connection_id):
+        """按connection_id选择分段锁, 仅用于连接表的写操作"""
+        return self._stripes[hash(connection_id) & (LOCK_STRIPES - 1)]
+    
+    def _reaper(self):
+        """后台回收已断开或长时间空闲的连接"""
+        while True:
+            time.sleep(self.scan_interval)
+            try:
+                self._reap_once()
+            except Exception as e:
+                logger.error(f"Connection reaper failed: {str(e)}")
+    
+    def _reap_once(self):
+        now = time.monotonic()
+        for connection_id, entry in list(self.active_connections.items()):
+            idle = now - self._last_used.get(connection_id, now)
+            if entry.transport.is_active() and (self._in_flight.get(connection_id) or idle < self.idle_ttl):
+                continue
+            
+            with self._stripe(connection_id):
+                # 扫描期间连接可能已被替换、断开或开始执行命令, 只移除同一条仍然空闲的记录
+                if self.active_connections.get(connection_id) is not entry:
+                    continue
+                if self._in_flight.get(connection_id) and entry.transport.is_active():
+                    continue
+                del self.active_connections[connection_id]
+                self._last_used.pop(connection_id, None)
+            
+            logger.info(f"Reaping SSH connection {entry.display_name} (idle {idle:.0f}s)")
+            entry.client.close()
     
     def connect(self, host, port, username, password, timeout=30):
-        """建立SSH连接"""
+        """建立SSH连接, 返回连接ID与可读的连接名"""
         try:
             client = paramiko.SSHClient()
             client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -43,29 +111,59 @@ class SSHCollector:
                 timeout=timeout
             )
             
-            connection_id = f"{host}:{port}:{username}"
-            with self.lock:
-                self.active_connections[connection_id] = client
+            transport = client.get_transport()
+            transport.set_keepalive(KEEPALIVE_INTERVAL)
             
-            return connection_id, None
+            display_name = f"{host}:{port}:{username}"
+            connection_id = make_connection_id(display_name)
+            with self._stripe(connection_id):
+                self.active_connections[connection_id] = ConnEntry(client, transport, display_name)
+                self._last_used[connection_id] = time.monotonic()
+            
+            return {'connection_id': connection_id, 'display_name': display_name}, None
         except Exception as e:
             logger.error(f"SSH connection failed: {str(e)}")
             return None, str(e)
     
+    def _begin_command(self, connection_id, entry):
+        """登记一条执行中的命令并刷新最近使用时间; 连接已被移除或替换时返回False"""
+        with self._stripe(connection_id):
+            if self.active_connections.get(connection_id) is not entry:
+                return False
+            self._in_flight[connection_id] = self._in_flight.get(connection_id, 0) + 1
+            self._last_used[connection_id] = time.monotonic()
+            return True
+    
+    def _end_command(self, connection_id, entry):
+        """注销执行中的命令; 连接仍在表中时以命令结束时间作为最近使用时间"""
+        with self._stripe(connection_id):
+            count = self._in_flight.get(connection_id, 0) - 1
+            if count > 0:
+                self._in_flight[connection_id] = count
+            else:
+                self._in_flight.pop(connection_id, None)
+            if self.active_connections.get(connection_id) is entry:
+                self._last_used[connection_id] = time.monotonic()
+    
     def execute_command(self, connection_id, command):
         """执行SSH命令"""
         try:
-            with self.lock:
-                client = self.active_connections.get(connection_id)
+            entry = self.active_connections.get(connection_id)
             
-            if not client:
+            if not entry or not self._begin_command(connection_id, entry):
                 return None, "Connection not found"
             
-            stdin, stdout, stderr = client.exec_command(command)
-            
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
-            exit_status = stdout.channel.recv_exit_status()
+            try:
+                # 复用已建立的transport, 每条命令打开独立通道, 多条命令可在同一连接上并发执行
+                channel = entry.transport.open_session()
+                try:
+                    channel.exec_command(command)
+                    output, error = self._read_output(channel)
+                    exit_status = channel.recv_exit_status()
+                finally:
+                    channel.close()
+            finally:
+                self._end_command(connection_id, entry)
             
             return {
                 'output': output,
@@ -77,20 +175,53 @@ class SSHCollector:
             logger.error(f"Command execution failed: {str(e)}")
             return None, str(e)
     
+    def _read_output(self, channel):
+        """交替读取stdout/stderr并增量解码, 避免整段缓冲后再复制解码, 也避免任一管道写满阻塞对端"""
+        out_decoder = codecs.getincrementaldecoder('utf-8')()
+        err_decoder = codecs.getincrementaldecoder('utf-8')()
+        out_parts = []
+        err_parts = []
+        
+        while True:
+            # 先记录EOF状态: EOF之前的数据必然已进入缓冲区, 读空后即可结束
+            eof = channel.eof_received or channel.closed
+            received = False
+            if channel.recv_ready():
+                out_parts.append(out_decoder.decode(channel.recv(READ_CHUNK)))
+                received = True
+            if channel.recv_stderr_ready():
+                err_parts.append(err_decoder.decode(channel.recv_stderr(READ_CHUNK)))
+                received = True
+            if received:
+                continue
+            if eof:
+                break
+            select.select([channel], [], [], 1.0)
+        
+        out_parts.append(out_decoder.decode(b'', final=True))
+        err_parts.append(err_decoder.decode(b'', final=True))
+        return ''.join(out_parts), ''.join(err_parts)
+    
     def disconnect(self, connection_id):
         """断开SSH连接"""
         try:
-            with self.lock:
-                client = self.active_connections.pop(connection_id, None)
+            with self._stripe(connection_id):
+                entry = self.active_connections.pop(connection_id, None)
+                self._last_used.pop(connection_id, None)
             
-            if client:
-                client.close()
+            if entry:
+                entry.client.close()
                 return True
             return False
         except Exception as e:
             logger.error(f"Disconnect failed: {str(e)}")
             return False
 
+# 各接口的必填字段, 模块加载时构建一次
+CONNECT_FIELDS = frozenset(('host', 'port', 'username', 'password'))
+EXECUTE_FIELDS = frozenset(('connection_id', 'command'))
+CONNECTION_FIELDS = frozenset(('connection_id',))
+
 ssh_collector = SSHCollector()
 
 @app.route('/health', methods=['GET'])
@@ -107,11 +238,10 @@ def connect():
     """建立SSH连接"""
     data = request.get_json()
     
-    required_fields = ['host', 'port', 'username', 'password']
-    if not all(field in data for field in required_fields):
+    if not CONNECT_FIELDS <= data.keys():
         return jsonify({'error': 'Missing required fields'}), 400
     
-    connection_id, error = ssh_collector.connect(
+    connection, error = ssh_collector.connect(
         data['host'],
         data['port'],
         data['username'],
@@ -123,7 +253,8 @@ def connect():
         return jsonify({'error': error}), 500
     
     return jsonify({
-        'connection_id': connection_id,
+        'connection_id': connection['connection_id'],
+        'display_name': connection['display_name'],
         'status': 'connected',
         'timestamp': datetime.now().isoformat()
     })
@@ -133,7 +264,7 @@ def execute():
     """执行SSH命令"""
     data = request.get_json()
     
-    if 'connection_id' not in data or 'command' not in data:
+    if not EXECUTE_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id or command'}), 400
     
     result, error = ssh_collector.execute_command(
@@ -151,7 +282,7 @@ def disconnect():
     """断开SSH连接"""
     data = request.get_json()
     
-    if 'connection_id' not in data:
+    if not CONNECTION_FIELDS <= data.keys():
         return jsonify({'error': 'Missing connection_id'}), 400
     
     success = ssh_collector.disconnect(data['connection_id'])
@@ -167,11 +298,12 @@ def disconnect():
 @app.route('/connections', methods=['GET'])
 def list_connections():
     """列出活动连接"""
-    with ssh_collector.lock:
-        connections = list(ssh_collector.active_connections.keys())
+    snapshot = list(ssh_collector.active_connections.items())
+    connections = [conn_id for conn_id, _ in snapshot]
     
     return jsonify({
         'active_connections': connections,
+        'display_names': {conn_id: entry.display_name for conn_id, entry in snapshot},
         'count': len(connections),
         'timestamp': datetime.now().isoformat()
     })
@@ -181,4 +313,4 @@ if __name__ == '__main__':
     os.makedirs('logs', exist_ok=True)
     
     logger.info("Starting SSH Collector...")
-    app.run(host='0.0.0.0', port=8010, debug=False)
\ No newline at end of file
+    WSGIServer(('0.0.0.0', 8010), app).serve_forever()
\ No newline at end of file
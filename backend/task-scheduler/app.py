@@ -1,215 +1,489 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, current_app, request, jsonify
 from flask_cors import CORS
-import schedule
 import time
 import threading
+import heapq
+import math
+import itertools
+import functools
+from collections import OrderedDict
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
+import sys
+import fcntl
+import tempfile
 import json
 import requests
-from concurrent.futures import ThreadPoolExecutor
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, Future
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/task_scheduler.log'),
-        logging.StreamHandler()
-    ]
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.clock import iso_now
+from common.redis_client import RedisClient
+from common.logging_setup import setup_logging
+from common.json_provider import OrjsonProvider
+
+# 配置日志: 任务线程只将日志放入队列, 由后台监听线程负责写文件
+setup_logging('logs/task_scheduler.log')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)
+class TaskStoreError(Exception):
+    """任务定义写入或删除Redis失败, 本进程的任务保持不变"""
+
+MAX_RESULTS = int(os.getenv('SCHEDULER_MAX_RESULTS', 10000))
+
+# 任务定义持久化到Redis哈希表: 任务ID -> 任务配置, 重启后据此恢复调度
+TASKS_KEY = 'scheduler:tasks'
+redis_client = RedisClient(os.getenv('REDIS_URL'))
+# 各进程从Redis同步任务定义的间隔(秒), 多worker时其他worker上的增删由此生效
+SYNC_INTERVAL = int(os.getenv('SCHEDULER_SYNC_INTERVAL', 5))
+# leader锁文件: 同一主机上只有持有该文件锁的进程运行定时器, 避免多worker重复触发任务
+LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'task_scheduler.lock'))
+
+# 各服务同时执行的任务数上限, 达到上限时本次调度直接跳过, 避免慢服务占满线程池
+SERVICE_CONCURRENCY = {
+    'ssh': int(os.getenv('SCHEDULER_SSH_CONCURRENCY', 8)),
+    'api': int(os.getenv('SCHEDULER_API_CONCURRENCY', 16)),
+    'snmp': int(os.getenv('SCHEDULER_SNMP_CONCURRENCY', 32))
+}
+
+# 调度间隔单位对应的秒数
+INTERVAL_SECONDS = {
+    'seconds': 1,
+    'minutes': 60,
+    'hours': 3600,
+    'days': 86400
+}
+# 最小调度间隔(秒), 保证重新入堆的到期时间总在当前时间之后
+MIN_INTERVAL = 1
 
-# 任务存储
-tasks = {}
-task_results = {}
-executor = ThreadPoolExecutor(max_workers=5)
-scheduler_thread = None
-scheduler_running = False
+# 调用服务的超时时间: (连接超时, 读取超时)
+SERVICE_TIMEOUT = (3, 30)
+
+# SSH任务合并为批量请求发往网关: 攒批窗口(秒)与单批最大操作数
+BATCH_WINDOW = 0.05
+BATCH_MAX_OPS = 32
+# 批量请求内每个SSH会话最多包含三次服务调用
+BATCH_TIMEOUT = (3, 120)
+# 任务线程等待批量结果的上限, 发送线程异常时也不会一直占用任务线程
+BATCH_RESULT_TIMEOUT = BATCH_WINDOW + sum(BATCH_TIMEOUT)
+
+def format_epoch(ts):
+    """epoch秒转为ISO格式字符串, 仅在输出时调用"""
+    return datetime.fromtimestamp(ts).isoformat() if ts is not None else None
+
+class TaskRec:
+    """任务记录; 使用__slots__省去每个任务的实例字典, 时间以epoch秒保存, 输出时再格式化"""
+    __slots__ = ('config', 'status', 'created_at', 'last_run', 'next_run', 'run_count', 'lock', 'call', 'limit')
+    
+    def __init__(self, config, call, limit):
+        self.config = config
+        self.status = 'scheduled'
+        self.created_at = time.time()
+        self.last_run = None
+        self.next_run = None
+        self.run_count = 0
+        # 单个任务状态更新锁、已绑定服务配置的调用函数、所属服务的并发信号量
+        self.lock = threading.Lock()
+        self.call = call
+        self.limit = limit
+    
+    def to_dict(self):
+        return {
+            'config': self.config,
+            'status': self.status,
+            'created_at': format_epoch(self.created_at),
+            'last_run': format_epoch(self.last_run),
+            'next_run': format_epoch(self.next_run),
+            'run_count': self.run_count
+        }
 
 class TaskScheduler:
     def __init__(self):
         self.tasks = {}
-        self.lock = threading.Lock()
+        # 全局锁只保护任务的增删及与Redis的同步; 单个任务的状态更新使用各自的锁, 互不阻塞
+        self.lock = threading.RLock()
+        # 执行结果按写入顺序保存, 超过上限时淘汰最旧的结果, 避免进程内存随运行次数无限增长
+        self.results = OrderedDict()
+        self.results_lock = threading.Lock()
+        # 任务执行线程池; 任务以等待网关响应为主, 默认与各服务并发上限之和一致
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SCHEDULER_MAX_WORKERS', sum(SERVICE_CONCURRENCY.values())))
+        )
+        # 批量请求发送线程池, 与任务线程池分开, 避免等待批量结果的任务占满线程导致无法发送
+        self.batch_executor = ThreadPoolExecutor(max_workers=4)
+        
+        # running表示本进程持有leader锁并运行定时器
+        self.running = False
+        self._started = False
+        self._lock_file = None
+        # 校验失败的Redis任务定义, 配置未变化时同步不再重复报错
+        self._rejected = {}
+        self._limits = {
+            service_type: threading.BoundedSemaphore(limit)
+            for service_type, limit in SERVICE_CONCURRENCY.items()
+        }
+        
+        # 服务类型分发表
+        self._dispatch = {
+            'ssh': self._call_ssh_service,
+            'api': self._call_api_service,
+            'snmp': self._call_snmp_service
+        }
+        self.api_gateway_url = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
+        # 网关接口地址只拼接一次
+        self.url_batch = f"{self.api_gateway_url}/api/batch"
+        self.url_api = f"{self.api_gateway_url}/api/api/collect"
+        self.url_snmp = f"{self.api_gateway_url}/api/snmp/collect"
+        
+        # 复用到API网关的HTTP连接, 避免每次调度都重新建立TCP连接
+        # 所有请求都发往网关, 连接池大小与各服务并发上限之和一致
+        # Retry默认不对POST按状态码重试, 仅重试未发出请求的连接错误, 不会重复提交采集
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=sum(SERVICE_CONCURRENCY.values()),
+            max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # 请求体由orjson序列化后以data传入
+        self.session.headers['Content-Type'] = 'application/json'
+        
+        # 定时器: 按到期时间(monotonic)排序的最小堆, 元素为(到期时间, 序号, 任务ID, 间隔秒数, 任务记录)
+        # 到期时直接使用堆中的任务记录, 不再按任务ID查表
+        # 删除或重新添加任务时只撤销_jobs中的登记, 堆中旧条目到期弹出时再丢弃;
+        # 失效条目超过堆的一半时整体重建, 避免长间隔任务的旧条目长期占用内存
+        self._heap = []
+        self._jobs = {}
+        self._stale = 0
+        self._seq = itertools.count()
+        self._timer = threading.Condition()
+        
+        # 待发送的批量操作: (操作, Future)
+        self._batch_queue = []
+        self._batch_cond = threading.Condition()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
     
-    def add_task(self, task_id, task_config):
-        """添加定时任务"""
+    def add_task(self, task_id, task_config, persist=True):
+        """添加定时任务, 配置不合法时抛出ValueError, 写入Redis失败时抛出TaskStoreError; 校验全部通过后才写入Redis"""
+        # Redis哈希字段名总是以字符串读回, 非字符串ID同步时会被当作另一个任务
+        if not isinstance(task_id, str) or not task_id:
+            raise ValueError(f"task_id must be a non-empty string: {task_id!r}")
+        if not isinstance(task_config, dict):
+            raise ValueError("Task config must be an object")
+        if not isinstance(task_config.get('service_config', {}), dict):
+            raise ValueError("service_config must be an object")
+        interval_value = task_config.get('interval_value', 5)
+        if (isinstance(interval_value, bool) or not isinstance(interval_value, (int, float))
+                or not math.isfinite(interval_value) or interval_value <= 0):
+            raise ValueError(f"interval_value must be a positive number: {interval_value!r}")
+        call = self._bind_call(task_config)
+        task = TaskRec(task_config, call, self._limits[task_config['service_type']])
         with self.lock:
-            self.tasks[task_id] = {
-                'config': task_config,
-                'status': 'scheduled',
-                'created_at': datetime.now().isoformat(),
-                'last_run': None,
-                'next_run': None,
-                'run_count': 0
-            }
-        
-        # 根据配置创建schedule任务
-        self._schedule_task(task_id, task_config)
+            # 先写入Redis再修改内存: 未持久化的任务会在下次同步时被删除, 不能报告为已调度
+            if persist and not redis_client.hset(TASKS_KEY, task_id, task_config):
+                raise TaskStoreError(f"Failed to persist task {task_id}")
+            self.tasks[task_id] = task
+            
+            # 根据配置创建定时任务
+            self._schedule_task(task_id, task)
         logger.info(f"Task {task_id} scheduled")
     
-    def _schedule_task(self, task_id, config):
-        """创建schedule任务"""
-        interval_type = config.get('interval_type', 'minutes')
-        interval_value = config.get('interval_value', 5)
-        
-        if interval_type == 'seconds':
-            schedule.every(interval_value).seconds.do(self._execute_task, task_id)
-        elif interval_type == 'minutes':
-            schedule.every(interval_value).minutes.do(self._execute_task, task_id)
-        elif interval_type == 'hours':
-            schedule.every(interval_value).hours.do(self._execute_task, task_id)
-        elif interval_type == 'days':
-            schedule.every(interval_value).days.do(self._execute_task, task_id)
-    
-    def _execute_task(self, task_id):
-        """执行任务"""
-        try:
-            with self.lock:
+    def sync_tasks(self):
+        """以Redis中的任务定义为准增删本进程的任务; Redis不可用时保持现状"""
+        with self.lock:
+            # 读取失败时跳过本轮同步, 不能当作Redis中没有任务而删除本地任务
+            stored = redis_client.hgetall(TASKS_KEY)
+            if stored is None:
+                return
+            
+            for task_id, task_config in stored.items():
                 task = self.tasks.get(task_id)
+                if task is not None and task.config == task_config:
+                    continue
+                if self._rejected.get(task_id) == task_config:
+                    continue
+                try:
+                    self.add_task(task_id, task_config, persist=False)
+                    self._rejected.pop(task_id, None)
+                except Exception as e:
+                    # 单条坏记录只跳过并记录, 不能中断同步线程或start()
+                    self._rejected[task_id] = task_config
+                    logger.error(f"Failed to load task {task_id}: {str(e)}")
             
-            if not task:
+            for task_id in [task_id for task_id in self.tasks if task_id not in stored]:
+                self.remove_task(task_id, persist=False)
+    
+    def start(self):
+        """从Redis加载任务, 启动同步线程, 并尝试成为leader运行定时器"""
+        if self._started:
+            return
+        self._started = True
+        self.sync_tasks()
+        self._try_lead()
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+    
+    def _try_lead(self):
+        """尝试获取leader文件锁, 成功后启动定时器线程; 锁在进程退出时由内核释放"""
+        if self.running:
+            return
+        lock_file = open(LOCK_FILE, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        
+        self._lock_file = lock_file
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+        logger.info(f"Scheduler leader lock acquired by pid {os.getpid()}")
+    
+    def _sync_loop(self):
+        """定期同步任务定义; 非leader进程同时重试获取leader锁, 原leader退出后接管定时器"""
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                self.sync_tasks()
+                self._try_lead()
+            except Exception as e:
+                logger.error(f"Task sync failed: {str(e)}")
+    
+    def _schedule_task(self, task_id, task):
+        """将任务加入定时器, 首次执行在一个间隔之后"""
+        interval_type = task.config.get('interval_type', 'minutes')
+        interval_value = task.config.get('interval_value', 5)
+        
+        unit = INTERVAL_SECONDS.get(interval_type)
+        
+        with self._timer:
+            # 同一任务ID重新添加时撤销旧的定时登记
+            self._cancel_job(task_id)
+            if unit is None:
+                logger.warning(f"Task {task_id} has unsupported interval_type: {interval_type}")
                 return
+            interval = max(interval_value * unit, MIN_INTERVAL)
             
-            config = task['config']
-            
+            seq = next(self._seq)
+            self._jobs[task_id] = seq
+            heapq.heappush(self._heap, (time.monotonic() + interval, seq, task_id, interval, task))
+            task.next_run = time.time() + interval
+            # 新任务可能比当前堆顶更早到期, 唤醒调度线程重新计算等待时间
+            self._timer.notify()
+    
+    def _cancel_job(self, task_id):
+        """撤销任务的定时登记, 须持有self._timer"""
+        if self._jobs.pop(task_id, None) is None:
+            return
+        self._stale += 1
+        if self._stale > 64 and self._stale * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if self._jobs.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+            self._stale = 0
+    
+    def _pop_due(self):
+        """等待到堆顶任务到期, 弹出所有到期的(任务ID, 任务记录)并登记下一次执行时间"""
+        with self._timer:
+            while self.running:
+                if not self._heap:
+                    self._timer.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._timer.wait(delay)
+                    continue
+                
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, seq, task_id, interval, task = heapq.heappop(self._heap)
+                    if self._jobs.get(task_id) != seq:
+                        self._stale -= 1
+                        continue
+                    due.append((task_id, task))
+                    # 按固定频率排下一次; 落后超过一个间隔时(如进程被挂起)不补跑
+                    deadline += interval
+                    if deadline <= now:
+                        deadline = now + interval
+                    heapq.heappush(self._heap, (deadline, seq, task_id, interval, task))
+                    task.next_run = time.time() + (deadline - now)
+                if due:
+                    return due
+            return []
+    
+    def run(self):
+        """调度循环: 到期任务交给线程池, 其余时间阻塞等待"""
+        while self.running:
+            for task_id, task in self._pop_due():
+                self._submit_task(task_id, task)
+    
+    def _submit_task(self, task_id, task):
+        """到期任务提交到线程池执行, 调度线程只负责计时, 不被服务调用阻塞"""
+        if task.status == 'running':
+            logger.warning(f"Task {task_id} is still running, skipping this run")
+            return
+        
+        # 服务并发已满时不排队等待, 跳过本次调度
+        if not task.limit.acquire(blocking=False):
+            logger.warning(f"Task {task_id} skipped, {task.config['service_type']} concurrency limit reached")
+            return
+        self.executor.submit(self._execute_task, task_id, task)
+    
+    def _execute_task(self, task_id, task):
+        """执行任务, 结束后释放所属服务的并发信号量"""
+        # 本次执行的开始时间只取一次, last_run与结果键共用
+        started = time.time()
+        try:
             # 更新任务状态
-            with self.lock:
-                self.tasks[task_id]['status'] = 'running'
-                self.tasks[task_id]['last_run'] = datetime.now().isoformat()
-                self.tasks[task_id]['run_count'] += 1
+            with task.lock:
+                task.status = 'running'
+                task.last_run = started
+                task.run_count += 1
             
             # 执行任务
-            result = self._call_service(config)
+            result = task.call()
             
             # 保存结果
-            task_results[f"{task_id}_{datetime.now().isoformat()}"] = result
+            with self.results_lock:
+                self.results[f"{task_id}_{format_epoch(started)}"] = result
+                while len(self.results) > MAX_RESULTS:
+                    self.results.popitem(last=False)
             
             # 更新任务状态
-            with self.lock:
-                self.tasks[task_id]['status'] = 'completed'
+            task.status = 'completed'
             
             logger.info(f"Task {task_id} executed successfully")
             
         except Exception as e:
             logger.error(f"Task {task_id} execution failed: {str(e)}")
-            with self.lock:
-                self.tasks[task_id]['status'] = 'failed'
+            task.status = 'failed'
+        
+        finally:
+            task.limit.release()
     
-    def _call_service(self, config):
-        """调用服务"""
+    def _bind_call(self, config):
+        """按service_type解析服务调用函数并绑定服务配置, 每次执行不再重复分发"""
         service_type = config.get('service_type')
-        service_config = config.get('service_config', {})
-        
-        if service_type == 'ssh':
-            return self._call_ssh_service(service_config)
-        elif service_type == 'api':
-            return self._call_api_service(service_config)
-        elif service_type == 'snmp':
-            return self._call_snmp_service(service_config)
-        else:
+        handler = self._dispatch.get(service_type) if isinstance(service_type, str) else None
+        if handler is None:
             raise ValueError(f"Unknown service type: {service_type}")
+        return functools.partial(handler, config.get('service_config', {}))
     
     def _call_ssh_service(self, config):
-        """调用SSH服务"""
-        api_gateway_url = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
+        """调用SSH服务, 由网关在一次批量请求内完成连接、执行和断开"""
+        result = self._submit_batch_op({
+            'op': 'ssh.session',
+            'connection': config.get('connection', {}),
+            'command': config.get('command', 'echo "Hello World"')
+        }).result(timeout=BATCH_RESULT_TIMEOUT)
         
-        # 建立连接
-        connect_response = requests.post(
-            f"{api_gateway_url}/api/ssh/connect",
-            json=config.get('connection', {})
-        )
-        
-        if connect_response.status_code != 200:
-            raise Exception(f"SSH connection failed: {connect_response.text}")
-        
-        connection_id = connect_response.json()['connection_id']
+        if 'error' in result:
+            raise Exception(f"SSH session failed: {result['error']}")
         
-        try:
-            # 执行命令
-            execute_response = requests.post(
-                f"{api_gateway_url}/api/ssh/execute",
-                json={
-                    'connection_id': connection_id,
-                    'command': config.get('command', 'echo "Hello World"')
-                }
-            )
-            
-            result = execute_response.json()
+        return result['body']
+    
+    def _submit_batch_op(self, op):
+        """操作加入批量队列, 返回在批量响应到达后完成的Future"""
+        future = Future()
+        with self._batch_cond:
+            self._batch_queue.append((op, future))
+            self._batch_cond.notify()
+        return future
+    
+    def _batch_loop(self):
+        """攒批线程: 窗口到期或攒够BATCH_MAX_OPS个操作时发送一批"""
+        while True:
+            with self._batch_cond:
+                while not self._batch_queue:
+                    self._batch_cond.wait()
+                
+                deadline = time.monotonic() + BATCH_WINDOW
+                while len(self._batch_queue) < BATCH_MAX_OPS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._batch_cond.wait(remaining)
+                
+                batch = self._batch_queue[:BATCH_MAX_OPS]
+                del self._batch_queue[:BATCH_MAX_OPS]
             
-        finally:
-            # 断开连接
-            requests.post(
-                f"{api_gateway_url}/api/ssh/disconnect",
-                json={'connection_id': connection_id}
-            )
+            self.batch_executor.submit(self._flush_batch, batch)
+    
+    def _flush_batch(self, batch):
+        """发送一批操作到网关, 按顺序完成对应的Future"""
+        try:
+            # 响应在with块结束时关闭, 读取失败的连接不会被放回连接池
+            with self.session.post(
+                self.url_batch,
+                data=orjson.dumps({'ops': [op for op, _ in batch]}),
+                timeout=BATCH_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                results = orjson.loads(response.content)['results']
+            if len(results) != len(batch):
+                raise Exception(f"Batch returned {len(results)} results for {len(batch)} ops")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
         
-        return result
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
     
     def _call_api_service(self, config):
         """调用API服务"""
-        api_gateway_url = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
-        
-        response = requests.post(
-            f"{api_gateway_url}/api/api/collect",
-            json=config
-        )
-        
-        return response.json()
+        with self.session.post(
+            self.url_api,
+            data=orjson.dumps(config),
+            timeout=SERVICE_TIMEOUT
+        ) as response:
+            return orjson.loads(response.content)
     
     def _call_snmp_service(self, config):
         """调用SNMP服务"""
-        api_gateway_url = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
-        
-        response = requests.post(
-            f"{api_gateway_url}/api/snmp/collect",
-            json=config
-        )
-        
-        return response.json()
+        with self.session.post(
+            self.url_snmp,
+            data=orjson.dumps(config),
+            timeout=SERVICE_TIMEOUT
+        ) as response:
+            return orjson.loads(response.content)
     
-    def remove_task(self, task_id):
-        """移除任务"""
+    def remove_task(self, task_id, persist=True):
+        """移除任务, 从Redis删除失败时抛出TaskStoreError"""
         with self.lock:
             if task_id in self.tasks:
+                # 先从Redis删除: 删除失败时保留任务, 否则下次同步会把它重新加载回来
+                if persist and redis_client.hdel(TASKS_KEY, task_id) is None:
+                    raise TaskStoreError(f"Failed to delete task {task_id} from store")
                 del self.tasks[task_id]
-                # 清除schedule中的任务
-                schedule.clear(task_id)
+                # 撤销定时器登记
+                with self._timer:
+                    self._cancel_job(task_id)
                 logger.info(f"Task {task_id} removed")
                 return True
         return False
     
     def get_tasks(self):
-        """获取所有任务"""
-        with self.lock:
-            return dict(self.tasks)
+        """获取所有任务的快照, 不持锁, 不阻塞任务增删和状态更新"""
+        return {task_id: task.to_dict() for task_id, task in list(self.tasks.items())}
 
-task_scheduler = TaskScheduler()
+bp = Blueprint('task_scheduler', __name__)
 
-def run_scheduler():
-    """运行调度器"""
-    global scheduler_running
-    scheduler_running = True
-    
-    while scheduler_running:
-        schedule.run_pending()
-        time.sleep(1)
-
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': iso_now(),
         'service': 'task-scheduler',
-        'scheduler_running': scheduler_running,
-        'active_tasks': len(task_scheduler.get_tasks())
+        'scheduler_running': current_app.scheduler.running,
+        'active_tasks': len(current_app.scheduler.tasks)
     })
 
-@app.route('/tasks', methods=['POST'])
+@bp.route('/tasks', methods=['POST'])
 def create_task():
     """创建定时任务"""
     data = request.get_json()
@@ -220,53 +494,90 @@ def create_task():
     task_id = data['task_id']
     config = data['config']
     
-    task_scheduler.add_task(task_id, config)
+    try:
+        current_app.scheduler.add_task(task_id, config)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except TaskStoreError as e:
+        return jsonify({'error': str(e)}), 503
     
     return jsonify({
         'task_id': task_id,
         'status': 'scheduled',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': iso_now()
     })
 
-@app.route('/tasks', methods=['GET'])
+@bp.route('/tasks', methods=['GET'])
 def list_tasks():
     """列出所有任务"""
-    tasks = task_scheduler.get_tasks()
+    tasks = current_app.scheduler.get_tasks()
     return jsonify({
         'tasks': tasks,
         'count': len(tasks),
-        'timestamp': datetime.now().isoformat()
+        'timestamp': iso_now()
     })
 
-@app.route('/tasks/<task_id>', methods=['DELETE'])
+@bp.route('/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """删除任务"""
-    success = task_scheduler.remove_task(task_id)
+    try:
+        success = current_app.scheduler.remove_task(task_id)
+    except TaskStoreError as e:
+        return jsonify({'error': str(e)}), 503
     
     if success:
         return jsonify({
             'status': 'deleted',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': iso_now()
         })
     else:
         return jsonify({'error': 'Task not found'}), 404
 
-@app.route('/results', methods=['GET'])
+@bp.route('/results', methods=['GET'])
 def get_results():
-    """获取任务执行结果"""
-    return jsonify({
-        'results': task_results,
-        'count': len(task_results),
-        'timestamp': datetime.now().isoformat()
-    })
+    """获取任务执行结果, 按时间倒序分页: ?limit=100&offset=0
+
+    锁内只复制结果的引用, 响应体逐条序列化后流式返回, 不在内存中拼出完整JSON
+    """
+    limit = max(0, min(request.args.get('limit', 100, type=int), MAX_RESULTS))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    scheduler = current_app.scheduler
+    with scheduler.results_lock:
+        count = len(scheduler.results)
+        page = list(itertools.islice(reversed(scheduler.results.items()), offset, offset + limit))
+    
+    def generate():
+        yield b'{"results":{'
+        for i, (key, result) in enumerate(page):
+            yield (b',' if i else b'') + orjson.dumps(key) + b':' + orjson.dumps(result)
+        yield b'},' + orjson.dumps({
+            'count': count,
+            'limit': limit,
+            'offset': offset,
+            'timestamp': iso_now()
+        })[1:]
+    
+    return Response(generate(), mimetype='application/json')
+
+def create_app():
+    """创建应用; 每个应用持有独立的调度器实例app.scheduler, 由其start()在服务进程内启动"""
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    CORS(app)
+    app.scheduler = TaskScheduler()
+    app.register_blueprint(bp)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     # 确保日志目录存在
     os.makedirs('logs', exist_ok=True)
     
-    # 启动调度器线程
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
+    # 启动调度器
+    app.scheduler.start()
     
+    # 仅用于本地调试, 生产环境通过gunicorn启动: gunicorn -c gunicorn_conf.py app:app
     logger.info("Starting Task Scheduler...")
-    app.run(host='0.0.0.0', port=8040, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8040, debug=False, threaded=True)
\ No newline at end of file
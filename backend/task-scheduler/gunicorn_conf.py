@@ -0,0 +1,15 @@
+# Gunicorn配置: gthread线程worker
+# 任务定义以Redis为准, 各worker定期同步; 只有持有leader文件锁的worker运行定时器, 不会重复触发任务
+# 执行结果和运行计数仍保存在各worker进程内, 因此默认只启动一个worker
+import os
+
+bind = '0.0.0.0:8040'
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+keepalive = 30
+
+
+def post_worker_init(worker):
+    """worker进程加载应用后启动调度器"""
+    worker.wsgi.scheduler.start()